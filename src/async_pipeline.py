@@ -0,0 +1,333 @@
+"""
+Asyncio pipeline API for embedding the downloader and music remover in async services
+"""
+import asyncio
+import subprocess
+import time
+from src.config import Config
+from src.downloader import VideoDownloader
+from src.music_remover import MusicRemover
+from src.profiling import JobProfiler
+from src.settings import Settings
+from src.temp_manager import TempManager
+
+
+class ProgressStream:
+    """
+    Async stream of progress events
+
+    Events are ('progress', percent) and ('status', text) tuples, the same messages
+    the GUI puts on its queue. Iterate with `async for kind, value in stream`;
+    iteration ends when the job finishes.
+    """
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+
+    def put(self, kind, value):
+        """Publish an event (safe to call from worker threads)"""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (kind, value))
+
+    def close(self):
+        """End the stream"""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    def progress(self, value):
+        self.put('progress', value)
+
+    def status(self, text):
+        self.put('status', text)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self._queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+async def run_command(command, text=False, profiler=None):
+    """
+    Run a command with asyncio subprocess management
+
+    The process is killed if the awaiting task is cancelled. With an enabled
+    JobProfiler the command line, duration and exit code are recorded.
+
+    Returns:
+        (stdout, stderr)
+    """
+    started = time.time()
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+
+    if profiler:
+        profiler.record(command, started, time.perf_counter() - start, process.returncode)
+
+    if text:
+        stdout = stdout.decode(errors='replace')
+        stderr = stderr.decode(errors='replace')
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return stdout, stderr
+
+
+class AsyncVideoDownloader:
+    """Awaitable wrapper around VideoDownloader"""
+
+    def __init__(self, progress=None, settings=None, profiler=None):
+        self.progress = progress
+        self.settings = settings or Settings.load()
+        # JobProfiler recording the download's subprocesses (section joins)
+        self.profiler = profiler
+        self.sections_downloaded = False
+        self.audio_file = None
+
+    def _downloader(self):
+        return VideoDownloader(
+            progress_callback=self.progress.progress if self.progress else None,
+            status_callback=self.progress.status if self.progress else None,
+            profiler=self.profiler,
+            settings=self.settings
+        )
+
+    async def download(self, url, custom_format=None, time_ranges=None):
+        """
+        Download video from URL
+
+        yt-dlp is a blocking library, so the download runs in the loop's default
+        executor; progress is forwarded to the progress stream.
+
+        Returns:
+            Path to downloaded (video) file; a separately downloaded audio stream
+            is left in self.audio_file
+        """
+        downloader = self._downloader()
+        path = await asyncio.to_thread(
+            downloader.download, url, custom_format, False, time_ranges
+        )
+        self.sections_downloaded = downloader.sections_downloaded
+        self.audio_file = downloader.audio_file
+        return path
+
+    async def expand_url(self, url):
+        """Expand a playlist or channel URL into individual video URLs"""
+        return await asyncio.to_thread(self._downloader().expand_url, url)
+
+
+class AsyncMusicRemover:
+    """
+    Music remover whose stages are awaitable FFmpeg/Demucs subprocesses
+
+    With a profiler, subprocess runs and separation traces are recorded. There is
+    no cProfile dump here: jobs interleave on the event loop, so a per-job Python
+    profile would mostly measure other jobs.
+    """
+
+    def __init__(self, progress=None, separation_semaphore=None, temp_manager=None, separator=None,
+                 profiler=None, settings=None):
+        self.progress = progress
+        self.separation_semaphore = separation_semaphore
+        self.temp_manager = temp_manager or TempManager(progress.status if progress else None)
+        self.profiler = profiler or JobProfiler("async", enabled=False)
+        # The job's steps (paths, command lines, progress) come from the blocking implementation
+        self._remover = MusicRemover(
+            temp_manager=self.temp_manager, separator=separator, profiler=self.profiler, settings=settings
+        )
+        self.settings = self._remover.settings
+        # The pool serving this job's model, if any
+        self.separator = self._remover.separator
+
+    def _report(self, status, percent):
+        if self.progress:
+            self.progress.status(status)
+            self.progress.progress(percent)
+
+    async def extract_audio(self, video_path, tracks, time_ranges=None, source_path=None):
+        """Extract the given audio tracks of every section; returns the WAV paths per section"""
+        return await self._drive(self._remover._extract_steps(video_path, tracks, time_ranges, source_path))
+
+    async def separate_audio(self, audio_paths, video_path=None):
+        """Separate audio using Demucs, limited by the separation semaphore if one is set"""
+        trace_path = self._remover._separation_trace_path(video_path)
+        if self.separator:
+            # Loading the model and spawning workers blocks for seconds; keep it off the loop
+            await asyncio.to_thread(self.separator.start)
+            # Worker processes do the work; the pool bounds concurrency itself
+            await asyncio.gather(*[
+                asyncio.wrap_future(self.separator.submit(
+                    audio_path, self._remover.work_dir, self.separator._numbered(trace_path, index)
+                ))
+                for index, audio_path in enumerate(audio_paths)
+            ])
+            return [self._remover._find_vocals(audio_path) for audio_path in audio_paths]
+
+        command = self.profiler.wrap_python_module(self._remover._separate_command(audio_paths), trace_path)
+        try:
+            if self.separation_semaphore:
+                async with self.separation_semaphore:
+                    await run_command(command, text=True, profiler=self.profiler)
+            else:
+                await run_command(command, text=True, profiler=self.profiler)
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Demucs error: {e.stderr}")
+
+        return [self._remover._find_vocals(audio_path) for audio_path in audio_paths]
+
+    async def combine_video_audio(self, video_path, vocals_groups, tracks, time_ranges=None, source_path=None):
+        """Combine the original video (or its sections, joined) with the new audio tracks"""
+        return await self._drive(
+            self._remover._combine_steps(video_path, vocals_groups, tracks, time_ranges, source_path)
+        )
+
+    async def remove_music(self, video_path, time_ranges=None, audio_tracks=None, audio_path=None):
+        """
+        Remove music from video, keeping only vocals and other sounds
+
+        Args:
+            video_path: Path to input video file
+            time_ranges: Optional list of (start, end) seconds to process
+            audio_tracks: Optional audio stream indices or language codes (None = settings.audio_tracks)
+            audio_path: Optional separately downloaded audio stream to read the audio from
+
+        Returns:
+            Path to output video without music
+        """
+        video_path, audio_path = self._remover._input_paths(video_path, audio_path)
+        Config.setup_directories()
+
+        tracks, required_bytes = await asyncio.to_thread(
+            self._remover._prepare, video_path, time_ranges, audio_tracks, audio_path
+        )
+
+        # Intermediates live in a per-job directory that is removed even if a step fails
+        async with self.temp_manager.async_job_dir(required_bytes) as work_dir:
+            self._remover.work_dir = work_dir
+            output_path = await self._process(video_path, tracks, time_ranges, audio_path)
+
+        self._report("Music removal completed!", 100)
+        return output_path
+
+    async def _process(self, video_path, tracks, time_ranges=None, audio_path=None):
+        """Run extraction, separation and muxing inside the current work dir"""
+        return await self._drive(self._remover._steps(video_path, tracks, time_ranges, audio_path))
+
+    async def _drive(self, steps):
+        """Execute the steps of a MusicRemover step generator on the event loop"""
+        try:
+            step = next(steps)
+            while True:
+                step = steps.send(await self._run_step(step))
+        except StopIteration as done:
+            return done.value
+        finally:
+            steps.close()
+
+    async def _run_step(self, step):
+        """Await one step: commands run concurrently, blocking calls in a thread"""
+        kind, *args = step
+        if kind == 'report':
+            self._report(*args)
+        elif kind == 'run':
+            await asyncio.gather(*[run_command(command, profiler=self.profiler) for command in args[0]])
+        elif kind == 'separate':
+            return await self.separate_audio(*args)
+        elif kind == 'call':
+            function, *call_args = args
+            return await asyncio.to_thread(function, *call_args)
+        else:
+            raise ValueError(f"Unknown step: {kind}")
+
+
+class AsyncPipelineRunner:
+    """
+    Runs download + music removal jobs from one event loop
+
+    A semaphore bounds how many jobs run at once and a second one bounds how many
+    Demucs separations run at once, since those are CPU/GPU bound. Every job runs
+    with its own frozen Settings, so jobs using different models or presets can
+    share one runner.
+    """
+
+    def __init__(self, max_jobs=None, max_separations=None, separator=None, settings=None):
+        self.job_semaphore = asyncio.Semaphore(max_jobs or Config.ASYNC_MAX_JOBS)
+        self.separation_semaphore = asyncio.Semaphore(max_separations or Config.ASYNC_MAX_SEPARATIONS)
+        Config.setup_directories()
+        self.temp_manager = TempManager()
+        self.temp_manager.start_janitor()
+        # Default settings for jobs that don't bring their own
+        self.settings = settings or Settings.load()
+        self.separator = separator
+        if self.separator is None and Config.SEPARATION_WORKERS:
+            from src.separator import ModelPools
+            self.separator = ModelPools()
+        if Config.BATCH_SHORT_CLIPS:
+            # Short clips of concurrent jobs share forward passes; long audio and
+            # other models go to the worker pools (or the CLI)
+            from src.batching import BatchingSeparator
+            self.separator = BatchingSeparator(self.settings, fallback=self.separator)
+
+    async def run_job(self, url, custom_format=None, time_ranges=None, progress=None, settings=None):
+        """
+        Download a video and remove its music
+
+        Args:
+            url: Video URL
+            custom_format: Optional custom format string
+            time_ranges: Optional list of (start, end) seconds to process
+            progress: Optional ProgressStream; it is closed when the job ends
+            settings: Optional Settings for this job (defaults to the runner's)
+
+        Returns:
+            Path to output video without music
+        """
+        settings = settings or self.settings
+        profiler = JobProfiler(url.rstrip('/').rsplit('/', 1)[-1])
+        try:
+            async with self.job_semaphore:
+                downloader = AsyncVideoDownloader(progress, settings, profiler)
+                video_path = await downloader.download(url, custom_format, time_ranges)
+
+                remover = AsyncMusicRemover(
+                    progress, self.separation_semaphore, self.temp_manager, self.separator, profiler,
+                    settings
+                )
+                return await remover.remove_music(
+                    video_path, None if downloader.sections_downloaded else time_ranges,
+                    audio_path=downloader.audio_file
+                )
+        finally:
+            profiler.write_subprocesses()
+            if progress:
+                progress.close()
+
+    async def run(self, urls, custom_format=None, time_ranges=None, settings=None):
+        """
+        Run many jobs concurrently
+
+        Args:
+            urls: Video URLs
+            custom_format: Optional custom format string
+            time_ranges: Optional list of (start, end) seconds to process
+            settings: Optional Settings for all of these jobs (defaults to the runner's)
+
+        Returns:
+            List with an output path or the raised exception for each URL, in order
+        """
+        return await asyncio.gather(
+            *[self.run_job(url, custom_format, time_ranges, settings=settings) for url in urls],
+            return_exceptions=True
+        )
@@ -0,0 +1,299 @@
+"""
+Cross-job micro-batching: short clips from concurrent jobs share model forward passes
+
+Each clip is cut into fixed-length, overlapping model segments. Segments from
+every clip that arrived within a short window are stacked into batches, run
+through the model together, and overlap-added back into per-clip stems.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from src.config import Config
+from src.profiling import torch_trace
+from src.separator import load_audio, load_model, separate_file, two_stem_split, write_stems
+from src.settings import Settings
+
+import soundfile
+import torch
+import torch.nn.functional as F
+from demucs.apply import apply_model
+
+
+def model_segment_seconds(model):
+    """Length of audio the model was trained on (the segment it separates best)"""
+    segment = getattr(model, 'segment', None)
+    if segment is None and hasattr(model, 'models'):
+        # BagOfModels: all members share the training segment
+        segment = model.models[0].segment
+    return float(segment)
+
+
+def chunk_starts(total, length, stride):
+    """Start offsets of segments covering `total` samples"""
+    starts = [0]
+    while starts[-1] + length < total:
+        starts.append(starts[-1] + stride)
+    return starts
+
+
+def overlap_weight(length):
+    """Triangular cross-fade weight, as used by Demucs when splitting"""
+    return torch.cat([
+        torch.arange(1, length // 2 + 1),
+        torch.arange(length - length // 2, 0, -1)
+    ]).float()
+
+
+class _Clip:
+    """One queued clip and its place in the current batch"""
+
+    def __init__(self, audio_path, output_dir, trace_path, future):
+        self.audio_path = audio_path
+        self.output_dir = output_dir
+        self.trace_path = trace_path
+        self.future = future
+        self.wav = None
+        self.mean = 0
+        self.std = 1
+        self.starts = []
+
+
+class BatchingSeparator:
+    """
+    Separator that batches short clips across jobs through one in-process model
+
+    It has the same submit()/separate() interface as SharedModelPool, so it can
+    be handed to MusicRemover and AsyncMusicRemover. The first clip of a batch
+    waits up to Config.BATCH_WINDOW_SECONDS for others; clips longer than
+    Config.BATCH_MAX_CLIP_SECONDS bypass batching and go to the fallback
+    (a SharedModelPool or ModelPools) or are separated on their own.
+    """
+
+    def __init__(self, settings=None, fallback=None, window=None, max_clip_seconds=None,
+                 max_clips=None, batch_size=None, overlap=None):
+        self.settings = settings or Settings.load()
+        self.model_name = self.settings.demucs_model
+        self.two_stems = self.settings.demucs_two_stems
+        self.fallback = fallback
+        self.window = Config.BATCH_WINDOW_SECONDS if window is None else window
+        self.max_clip_seconds = max_clip_seconds or Config.BATCH_MAX_CLIP_SECONDS
+        self.max_clips = max_clips or Config.BATCH_MAX_CLIPS
+        self.batch_size = batch_size or Config.BATCH_SIZE
+        self.overlap = Config.BATCH_OVERLAP if overlap is None else overlap
+        self.model = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._long_clips = None
+
+    def start(self):
+        """Load the model and start the scheduler thread"""
+        with self._lock:
+            if self._thread:
+                return self
+            self.model = load_model(self.model_name)
+            self._long_clips = ThreadPoolExecutor(max_workers=1)
+            self._thread = threading.Thread(target=self._schedule, daemon=True)
+            self._thread.start()
+        return self
+
+    def for_settings(self, settings):
+        """This separator for jobs using its model and stems, else the fallback's pool"""
+        if (settings.demucs_model, settings.demucs_two_stems) == (self.model_name, self.two_stems):
+            return self
+        return self.fallback.for_settings(settings) if self.fallback else None
+
+    def submit(self, audio_path, output_dir, trace_path=None):
+        """
+        Queue one file for separation (never blocks on inference)
+
+        Args:
+            audio_path: Audio file to separate
+            output_dir: Directory receiving <model>/<track>/ stems
+            trace_path: Optional path for a torch profiler trace; for a batched clip
+                it covers the whole shared batch
+
+        Returns:
+            concurrent.futures.Future resolving to the stem directory
+        """
+        self.start()
+        future = Future()
+        self._queue.put(_Clip(audio_path, output_dir, trace_path, future))
+        return future
+
+    def separate(self, audio_paths, output_dir, trace_path=None):
+        """Separate files (batched with any other pending clips), blocking until all are done"""
+        futures = [
+            self.submit(audio_path, output_dir, self._numbered(trace_path, index))
+            for index, audio_path in enumerate(audio_paths)
+        ]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _numbered(trace_path, index):
+        """Give each file of a batch its own trace file"""
+        if not trace_path or index == 0:
+            return trace_path
+        return trace_path.replace('.trace.json', f'_{index}.trace.json')
+
+    def _schedule(self):
+        """Scheduler loop: collect a window of clips, then separate them together"""
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            clips = [first]
+            deadline = time.monotonic() + self.window
+            while len(clips) < self.max_clips:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    clip = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if clip is None:
+                    stopping = True
+                    break
+                clips.append(clip)
+
+            short_clips = [clip for clip in clips if self._route(clip)]
+            if short_clips:
+                self._separate_batch(short_clips)
+
+    def _route(self, clip):
+        """Keep a short clip for the batch; hand a long one elsewhere. Returns True if kept"""
+        try:
+            duration = soundfile.info(str(clip.audio_path)).duration
+        except Exception as e:
+            clip.future.set_exception(e)
+            return False
+
+        if duration <= self.max_clip_seconds:
+            return True
+
+        pool = self.fallback.for_settings(self.settings) if self.fallback else None
+        if pool is not None:
+            self._chain(pool.submit(clip.audio_path, clip.output_dir, clip.trace_path), clip.future)
+        else:
+            self._long_clips.submit(self._separate_alone, clip)
+        return False
+
+    @staticmethod
+    def _chain(source, target):
+        """Resolve `target` with the outcome of `source`"""
+        def copy(done):
+            if done.exception() is not None:
+                target.set_exception(done.exception())
+            else:
+                target.set_result(done.result())
+        source.add_done_callback(copy)
+
+    def _separate_alone(self, clip):
+        """Separate a long clip with the usual split/overlap path"""
+        try:
+            with torch_trace(clip.trace_path):
+                stem_dir = separate_file(self.model, self.model_name, self.two_stems,
+                                         clip.audio_path, clip.output_dir)
+            clip.future.set_result(stem_dir)
+        except Exception as e:
+            clip.future.set_exception(e)
+
+    def _separate_batch(self, clips):
+        """Chunk every clip, run the chunks in batched forward passes and rebuild each clip"""
+        samplerate = self.model.samplerate
+        length = int(model_segment_seconds(self.model) * samplerate)
+        stride = max(1, int(length * (1 - self.overlap)))
+
+        segments = []
+        ready = []
+        for clip in clips:
+            try:
+                wav = load_audio(self.model, clip.audio_path)
+            except Exception as e:
+                clip.future.set_exception(e)
+                continue
+            # Normalize per clip, like separate_tensor
+            ref = wav.mean(0)
+            clip.mean, clip.std = ref.mean(), ref.std() + 1e-8
+            clip.wav = (wav - clip.mean) / clip.std
+            clip.starts = chunk_starts(clip.wav.shape[-1], length, stride)
+            for start in clip.starts:
+                segment = clip.wav[:, start:start + length]
+                segments.append(F.pad(segment, (0, length - segment.shape[-1])))
+            ready.append(clip)
+
+        if not ready:
+            return
+
+        trace_path = next((clip.trace_path for clip in ready if clip.trace_path), None)
+        try:
+            with torch_trace(trace_path), torch.inference_mode():
+                outputs = torch.cat([
+                    apply_model(self.model, torch.stack(segments[i:i + self.batch_size]),
+                                shifts=0, split=False)
+                    for i in range(0, len(segments), self.batch_size)
+                ])
+        except Exception as e:
+            for clip in ready:
+                clip.future.set_exception(e)
+            return
+
+        weight = overlap_weight(length)
+        offset = 0
+        for clip in ready:
+            count = len(clip.starts)
+            try:
+                sources = self._overlap_add(outputs[offset:offset + count], clip.starts,
+                                            clip.wav.shape[-1], weight)
+                sources = sources * clip.std + clip.mean
+                stems = two_stem_split(dict(zip(self.model.sources, sources)), self.two_stems)
+                clip.future.set_result(
+                    write_stems(self.model, self.model_name, stems, clip.audio_path, clip.output_dir)
+                )
+            except Exception as e:
+                clip.future.set_exception(e)
+            finally:
+                clip.wav = None
+            offset += count
+
+    @staticmethod
+    def _overlap_add(outputs, starts, total, weight):
+        """
+        Rebuild a clip from its segment outputs
+
+        Args:
+            outputs: (segments, sources, channels, length) model outputs
+            starts: Segment start offsets
+            total: Clip length in samples
+            weight: Cross-fade weight of one segment
+
+        Returns:
+            (sources, channels, total) tensor
+        """
+        out = torch.zeros(*outputs.shape[1:3], total)
+        weight_sum = torch.zeros(total)
+        for start, segment in zip(starts, outputs):
+            n = min(segment.shape[-1], total - start)
+            out[..., start:start + n] += segment[..., :n] * weight[:n]
+            weight_sum[start:start + n] += weight[:n]
+        return out / weight_sum
+
+    def close(self):
+        """Stop the scheduler after the queued clips are done"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join()
+        self._long_clips.shutdown(wait=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -11,17 +11,64 @@ class Config:
     TEMP_DIR = BASE_DIR / "temp"
     OUTPUT_DIR = BASE_DIR / "output"
 
+    # Optional JSON file overriding the per-job settings below (see src/settings.py)
+    SETTINGS_FILE = BASE_DIR / "settings.json"
+
     # yt-dlp settings
-    YTDLP_FORMAT = '--restrict-filenames -output "%(id)s.%(ext)s" [URL] --merge-output-format "mp4" bestvideo[height<=1080]+bestaudio/best[height<=1080]'
+    YTDLP_FORMAT = "bestvideo[height<=1080]+bestaudio/best[height<=1080]"  # Used for merged downloads
     YTDLP_MERGE_FORMAT = "mp4"
+    SEPARATE_STREAMS = True        # Fetch video and audio unmerged and mux once at the end (see src/format_policy.py)
+    MAX_VIDEO_HEIGHT = 1080        # Height limit for the separate-streams format policy
+
+    # Playlist / channel ingest
+    MAX_PARALLEL_DOWNLOADS = 3     # Playlist entries downloaded at the same time
+    CONCURRENT_FRAGMENTS = 4       # Parallel fragment downloads for HLS/DASH sources
+    DOWNLOAD_ARCHIVE = DOWNLOADS_DIR / "download_archive.txt"  # Skips already fetched playlist items
 
     # Demucs settings
     DEMUCS_MODEL = "htdemucs"      # or "mdx_extra_q" for less RAM, or your choice
     DEMUCS_TWO_STEMS = "vocals"    # Only separate vocals, keep other sounds
+    AUDIO_TRACKS = None            # None = every audio track, or e.g. [0, "eng"] (stream index or language)
+    SEPARATION_WORKERS = 0         # >0: worker processes sharing one in-memory model (0 = Demucs CLI per job)
+    SEPARATION_THREADS_PER_WORKER = None  # Torch threads per worker (None = torch default)
+
+    # Cross-job micro-batching of short clips (AsyncPipelineRunner)
+    BATCH_SHORT_CLIPS = False      # Separate short clips from concurrent jobs in shared forward passes
+    BATCH_MAX_CLIP_SECONDS = 60    # Longer audio is separated on its own
+    BATCH_WINDOW_SECONDS = 0.5     # How long the first clip waits for others to join its batch
+    BATCH_MAX_CLIPS = 16           # Clips collected into one batch at most
+    BATCH_SIZE = 8                 # Model segments per forward pass
+    BATCH_OVERLAP = 0.25           # Overlap between consecutive segments of a clip
+
+    # Async pipeline settings
+    ASYNC_MAX_JOBS = 4             # Jobs running at once in AsyncPipelineRunner
+    ASYNC_MAX_SEPARATIONS = 1      # Demucs runs at once (CPU/GPU heavy)
+
+    # Temp storage settings
+    USE_RAM_DISK = True            # Put intermediates on tmpfs when they fit
+    RAM_DISK_DIR = Path("/dev/shm")  # Ignored if it doesn't exist (e.g. on Windows)
+    RAM_DISK_MAX_FRACTION = 0.5    # Never fill more than this share of the RAM disk
+    TEMP_SPACE_HEADROOM = 1.5      # Safety factor on a job's estimated scratch space
+    TEMP_ADMISSION_TIMEOUT = 3600  # Seconds a job waits for free space before failing
+    TEMP_ADMISSION_POLL = 5        # Seconds between free space checks while waiting
+    ORPHAN_MAX_AGE = 6 * 3600      # Unowned temp artifacts older than this are deleted
+    JANITOR_INTERVAL = 15 * 60     # Seconds between orphan sweeps
+
+    # Live mode settings (latency is roughly segment + lookahead + processing time)
+    LIVE_OUTPUT_DIR = OUTPUT_DIR / "live"
+    LIVE_SEGMENT_SECONDS = 4       # Length of ingested and published HLS segments
+    LIVE_CONTEXT_SECONDS = 2       # Past audio fed to the model with each segment
+    LIVE_LOOKAHEAD_SECONDS = 1     # Future audio waited for before separating a segment
+    LIVE_PLAYLIST_SIZE = 6         # Segments listed in the rolling playlist
+    LIVE_TARGET_LATENCY = 15       # Seconds; a warning is reported when exceeded
 
     # FFmpeg settings
     FFMPEG_PRESET = "medium"       # "ultrafast", "fast", "medium", "slow", "veryslow"
 
+    # Profiling (also enabled by `--profile` or the HVMR_PROFILE=1 environment variable)
+    PROFILE_JOBS = False
+    PROFILE_DIR = BASE_DIR / "profiles"
+
     # GUI settings
     WINDOW_WIDTH = 700
     WINDOW_HEIGHT = 900
@@ -2,15 +2,34 @@
 Video downloader module using yt-dlp
 """
 import yt_dlp
+from yt_dlp.utils import download_range_func
 from pathlib import Path
 from src.config import Config
+from src import format_policy
+from src.profiling import JobProfiler
+from src.settings import Settings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
 class VideoDownloader:
-    def __init__(self, progress_callback=None, status_callback=None):
+    def __init__(self, progress_callback=None, status_callback=None, profiler=None, settings=None,
+                 log_callback=None):
         self.progress_callback = progress_callback
         self.status_callback = status_callback
+        # Milestones of a playlist download worth keeping in a log (progress ticks only
+        # go to status_callback)
+        self.log_callback = log_callback
+        self.profiler = profiler or JobProfiler("download", enabled=False)
+        # Frozen per-job settings; Config/file/env defaults if not given
+        self.settings = settings or Settings.load()
         self.downloaded_file = None
+        # Separately downloaded audio stream of the last download (None if merged)
+        self.audio_file = None
+        self.sections_downloaded = False
+        # (url, error message) of every entry that failed in the last download_playlist
+        self.playlist_errors = []
+        # (url, raw info dict) of a single video extracted by expand_url, reused once by download
+        self._prefetched = None
 
     def download_progress_hook(self, d):
         """Hook for yt-dlp to report download progress"""
@@ -55,41 +74,140 @@ class VideoDownloader:
             bytes_count /= 1024
         return f"{bytes_count:.2f} TB"
 
-    def download(self, url, custom_format=None):
+    def _build_opts(self, custom_format=None, use_archive=False, time_ranges=None, separate_streams=False):
+        """Build yt-dlp options shared by single and playlist downloads"""
+        ydl_opts = {
+            'format': custom_format or self.settings.ytdlp_format,
+            'merge_output_format': self.settings.ytdlp_merge_format,
+            'outtmpl': str(Config.DOWNLOADS_DIR / '%(title)s.%(ext)s'),
+            'progress_hooks': [self.download_progress_hook],
+            'concurrent_fragment_downloads': self.settings.concurrent_fragments,
+            'noplaylist': True,
+            'quiet': False,
+            'no_warnings': False,
+        }
+        if use_archive:
+            ydl_opts['download_archive'] = str(Config.DOWNLOAD_ARCHIVE)
+        if separate_streams:
+            # Video and audio land in their own files and are muxed once, after separation
+            ydl_opts['format'] = format_policy.stream_selector(max_height=self.settings.max_video_height)
+            ydl_opts['outtmpl'] = str(Config.DOWNLOADS_DIR / '%(title)s.f%(format_id)s.%(ext)s')
+        if time_ranges:
+            # Fetch only the requested sections; each one lands in its own file
+            ydl_opts['download_ranges'] = download_range_func(
+                None, [(start, float('inf') if end is None else end) for start, end in time_ranges]
+            )
+            ydl_opts['force_keyframes_at_cuts'] = True
+            ydl_opts['outtmpl'] = str(Config.DOWNLOADS_DIR / '%(title)s.section-%(section_start)s.%(ext)s')
+        return ydl_opts
+
+    def _resolve_downloaded_files(self, info):
+        """Find the final files for a download (after merging), falling back to the hook"""
+        files = [
+            download['filepath']
+            for download in (info or {}).get('requested_downloads') or []
+            if download.get('filepath')
+        ]
+        if not files and self.downloaded_file:
+            files = [self.downloaded_file]
+        return files
+
+    def _join_sections(self, section_files):
+        """Concatenate downloaded sections (in time order) into a single file"""
+        section_files = [Path(f) for f in section_files]
+        if len(section_files) == 1:
+            return section_files[0]
+
+        first = section_files[0]
+        joined_path = first.with_name(f"{first.stem.rsplit('.section-', 1)[0]}_sections{first.suffix}")
+        list_path = first.with_name(f"{first.stem}_concat.txt")
+        list_path.write_text(
+            ''.join(f"file '{f.resolve().as_posix()}'\n" for f in section_files),
+            encoding='utf-8'
+        )
+
+        try:
+            command = [
+                'ffmpeg', '-f', 'concat', '-safe', '0',
+                '-i', str(list_path),
+                '-c', 'copy',
+                '-y', str(joined_path)
+            ]
+            self.profiler.run(command)
+        finally:
+            list_path.unlink(missing_ok=True)
+
+        for f in section_files:
+            f.unlink(missing_ok=True)
+        return joined_path
+
+    def download(self, url, custom_format=None, use_archive=False, time_ranges=None):
         """
         Download video from URL
 
         Args:
             url: Video URL
             custom_format: Optional custom format string (overrides config)
+            use_archive: Skip the video if it is already recorded in the download archive
+            time_ranges: Optional list of (start, end) seconds to fetch instead of the
+                whole video. If the extractor can't download sections, the full video is
+                downloaded and sections_downloaded stays False.
+
+        Full downloads without a custom format follow the format policy when
+        settings.separate_streams is on: the audio stream is left unmerged and
+        exposed as self.audio_file.
 
         Returns:
-            Path to downloaded file
+            Path to downloaded (video) file, or None if it was skipped by the archive
         """
         if self.status_callback:
             self.status_callback("Starting download...")
 
         Config.setup_directories()
-
-        ydl_opts = {
-            'format': custom_format or Config.YTDLP_FORMAT,
-            'merge_output_format': Config.YTDLP_MERGE_FORMAT,
-            'outtmpl': str(Config.DOWNLOADS_DIR / '%(title)s.%(ext)s'),
-            'progress_hooks': [self.download_progress_hook],
-            'quiet': False,
-            'no_warnings': False,
-        }
+        self.downloaded_file = None
+        self.audio_file = None
+        self.sections_downloaded = False
+        separate_streams = False
 
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+            info = None
+            if time_ranges:
+                try:
+                    info = self._extract(url, self._build_opts(custom_format, use_archive, time_ranges))
+                    self.sections_downloaded = True
+                except yt_dlp.utils.DownloadError as e:
+                    if self.status_callback:
+                        self.status_callback(f"Section download not supported ({e}), downloading full video...")
+                    self.downloaded_file = None
+
+            if not self.sections_downloaded:
+                separate_streams = self.settings.separate_streams and not custom_format
+                info = self._extract(
+                    url, self._build_opts(custom_format, use_archive, separate_streams=separate_streams)
+                )
+
+            downloaded_files = self._resolve_downloaded_files(info)
+
+            if use_archive and not downloaded_files:
+                if self.status_callback:
+                    self.status_callback("Already in download archive, skipped.")
+                return None
+
+            if not downloaded_files:
+                raise RuntimeError("Download failed: No file path returned by yt-dlp.")
+
+            if self.sections_downloaded:
+                downloaded_file = self._join_sections(downloaded_files)
+            elif separate_streams:
+                downloaded_file, self.audio_file = format_policy.split_downloads(info, downloaded_files)
+            else:
+                downloaded_file = downloaded_files[0]
 
             if self.status_callback:
                 self.status_callback("Download successful!")
 
-            if not self.downloaded_file:
-                raise RuntimeError("Download failed: No file path returned by yt-dlp.")
-            return Path(self.downloaded_file)
+            self.downloaded_file = downloaded_file
+            return Path(downloaded_file)
 
 
         except Exception as e:
@@ -97,6 +215,160 @@ class VideoDownloader:
                 self.status_callback(f"Download error: {str(e)}")
             raise
 
+    def _extract(self, url, ydl_opts):
+        """Run yt-dlp and return the info dict of the downloaded video"""
+        prefetched, self._prefetched = self._prefetched, None
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if prefetched and prefetched[0] == url:
+                # expand_url already extracted this video; only format selection and download remain
+                return ydl.process_ie_result(prefetched[1], download=True)
+            return ydl.extract_info(url, download=True)
+
+    def expand_url(self, url):
+        """
+        Expand a playlist or channel URL into individual video URLs
+
+        Args:
+            url: Video, playlist or channel URL
+
+        A single video is extracted only once: its info dict is kept and reused by
+        the next download() of the same URL.
+
+        Returns:
+            List of video URLs (just [url] for a single video)
+        """
+        ydl_opts = {
+            'extract_flat': 'in_playlist',
+            'skip_download': True,
+            'quiet': True,
+            'no_warnings': True,
+        }
+        self._prefetched = None
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            if not info:
+                return [url]
+            if 'entries' not in info and info.get('_type', 'video') == 'video':
+                self._prefetched = (url, info)
+                return [url]
+
+            # Redirects and playlists still need resolving (flat, so entries aren't extracted)
+            info = ydl.process_ie_result(info, download=False)
+            if not info or 'entries' not in info:
+                return [url]
+            return list(dict.fromkeys(self._iter_entry_urls(ydl, info)))
+
+    def _iter_entry_urls(self, ydl, info, depth=0):
+        """Walk playlist entries, descending into nested playlists (e.g. channel tabs)"""
+        for entry in info.get('entries') or []:
+            if not entry:
+                continue
+            if 'entries' in entry:
+                yield from self._iter_entry_urls(ydl, entry, depth + 1)
+                continue
+
+            entry_url = entry.get('url') or entry.get('webpage_url')
+            if not entry_url:
+                continue
+
+            # Channels list their tabs/playlists as flat URL entries
+            ie_key = entry.get('ie_key') or ''
+            if depth < 2 and (ie_key.endswith('Tab') or ie_key.endswith('Playlist')):
+                nested = ydl.extract_info(entry_url, download=False)
+                if nested and 'entries' in nested:
+                    yield from self._iter_entry_urls(ydl, nested, depth + 1)
+                continue
+
+            yield entry_url
+
+    def download_playlist(self, url, custom_format=None, max_workers=None, time_ranges=None,
+                          entry_urls=None):
+        """
+        Download every video of a playlist or channel with a bounded number of parallel downloads
+
+        Items already recorded in the download archive are skipped, so re-running a
+        channel only fetches new videos.
+
+        Args:
+            url: Playlist or channel URL
+            custom_format: Optional custom format string (overrides config)
+            max_workers: Parallel downloads (defaults to Config.MAX_PARALLEL_DOWNLOADS)
+            time_ranges: Optional (start, end) sections to fetch from every video
+            entry_urls: Video URLs already returned by expand_url(url), to skip expanding again
+
+        Returns:
+            List of (path, sections_downloaded, audio_path) for newly downloaded files, in
+            playlist order (audio_path is None unless the audio was downloaded separately).
+            Entries that failed are left in self.playlist_errors.
+        """
+        Config.setup_directories()
+        self.playlist_errors = []
+
+        if entry_urls is None:
+            if self.status_callback:
+                self.status_callback("Expanding playlist...")
+            urls = self.expand_url(url)
+        else:
+            urls = list(entry_urls)
+        total = len(urls)
+        self._milestone(f"Found {total} video(s)")
+
+        results = {}
+        errors = []
+        done = 0
+
+        def download_entry(index, entry_url):
+            def entry_status(text):
+                if self.status_callback:
+                    self.status_callback(f"[{index + 1}/{total}] {text}")
+
+            # One downloader per entry, so per-download state is not shared between threads
+            entry_downloader = VideoDownloader(
+                status_callback=entry_status, profiler=self.profiler, settings=self.settings
+            )
+            path = entry_downloader.download(entry_url, custom_format, use_archive=True, time_ranges=time_ranges)
+            return path and (path, entry_downloader.sections_downloaded, entry_downloader.audio_file)
+
+        workers = max(1, max_workers or Config.MAX_PARALLEL_DOWNLOADS)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(download_entry, index, entry_url): (index, entry_url)
+                for index, entry_url in enumerate(urls)
+            }
+            for future in as_completed(futures):
+                index, entry_url = futures[future]
+                try:
+                    result = future.result()
+                    if result:
+                        results[index] = result
+                    else:
+                        self._milestone(f"[{index + 1}/{total}] Already in download archive, skipped.")
+                except Exception as e:
+                    errors.append((entry_url, str(e)))
+                    self._milestone(f"[{index + 1}/{total}] Failed: {e}")
+
+                done += 1
+                if self.progress_callback:
+                    self.progress_callback(done * 100 / max(total, 1))
+
+        self._milestone(
+            f"Playlist done: {len(results)} new, "
+            f"{total - len(results) - len(errors)} skipped, {len(errors)} failed"
+        )
+
+        self.playlist_errors = errors
+        if errors and not results:
+            raise RuntimeError(f"All playlist downloads failed. First error: {errors[0][1]}")
+
+        return [results[index] for index in sorted(results)]
+
+    def _milestone(self, text):
+        """Report a playlist milestone to the status line and the log"""
+        if self.status_callback:
+            self.status_callback(text)
+        if self.log_callback:
+            self.log_callback(text)
+
     def download_async(self, url, custom_format=None, completion_callback=None):
         """
         Download video in a separate thread
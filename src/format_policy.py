@@ -0,0 +1,97 @@
+"""
+Format policy: pick yt-dlp streams that can be copied straight into the output
+container, so the source video is written once, by the final mux
+
+The video and audio streams are downloaded as separate files (a comma format
+selector, no yt-dlp merge). The audio is only decoded for separation, so any
+codec will do; the video is preferably one that can be stream-copied into
+OUTPUT_CONTAINER, otherwise the final mux has to re-encode it.
+"""
+import re
+from pathlib import Path
+
+# Container of the final output written by MusicRemover
+OUTPUT_CONTAINER = "mp4"
+
+# Codecs FFmpeg can stream-copy into OUTPUT_CONTAINER; matches both yt-dlp vcodec
+# values (avc1.640028, av01.0.08M.08, ...) and ffprobe codec names (h264, av1, ...)
+COPYABLE_VIDEO_CODECS = r'^(avc1|h264|av0?1|vp0?9|hvc1|hev1|hevc|h265)'
+
+
+def is_copyable(vcodec):
+    """Whether a video codec can be stream-copied into OUTPUT_CONTAINER (unknown counts as no)"""
+    return bool(vcodec) and re.match(COPYABLE_VIDEO_CODECS, vcodec) is not None
+
+
+def video_selector(max_height=None):
+    """
+    yt-dlp selector for the video stream
+
+    Every alternative is one best-of filter, so yt-dlp's format sorting (resolution
+    first, codec only as a tie-break) picks among all copyable codecs. Copyable
+    video-only formats come first, then copyable progressive formats, then any
+    video within the height limit; MusicRemover re-encodes a video it can't copy.
+    Formats that don't report a height are kept, so sites without resolution
+    metadata still select a video.
+
+    Args:
+        max_height: Optional height limit
+
+    Returns:
+        Format selector string
+    """
+    height = f"[height<=?{max_height}]" if max_height else ""
+    codec = f"[vcodec~='{COPYABLE_VIDEO_CODECS}']"
+    return "/".join([
+        f"bestvideo{height}{codec}",
+        f"best{height}{codec}",
+        f"bestvideo{height}",
+        f"best{height}",
+    ])
+
+
+def stream_selector(max_height=None):
+    """Selector downloading the video stream and the best audio as separate files"""
+    return f"({video_selector(max_height)}),bestaudio"
+
+
+def _is_audio_only(download):
+    return download.get('vcodec') == 'none' and download.get('acodec') != 'none'
+
+
+def split_downloads(info, downloaded_files):
+    """
+    Tell the video and audio files of a separate-streams download apart
+
+    A download whose video codec is unknown is taken for the video; only formats
+    yt-dlp reports as audio-only count as the audio stream.
+
+    Args:
+        info: yt-dlp info dict of the download
+        downloaded_files: Files resolved for the download (fallback if info has none)
+
+    Returns:
+        (video_path, audio_path); audio_path is None when no separate audio was
+        fetched and the audio has to come from the video file
+
+    Raises:
+        RuntimeError: If the download holds audio only
+    """
+    downloads = [
+        download for download in (info or {}).get('requested_downloads') or []
+        if download.get('filepath')
+    ]
+    if not downloads:
+        return Path(downloaded_files[0]), None
+
+    videos = [d for d in downloads if not _is_audio_only(d)]
+    if not videos:
+        raise RuntimeError(
+            f"No video stream selected for {(info or {}).get('title') or 'this video'}; "
+            f"only audio was downloaded"
+        )
+    # Prefer a download that reports its video codec over one that doesn't
+    video = next((d for d in videos if d.get('vcodec') not in (None, 'none')), videos[0])
+
+    audio = next((d for d in downloads if _is_audio_only(d)), None)
+    return Path(video['filepath']), Path(audio['filepath']) if audio else None
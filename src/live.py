@@ -0,0 +1,403 @@
+"""
+Live mode: separate a live or HLS stream in short overlapping windows and
+re-publish cleaned audio with the untouched video as a rolling HLS playlist
+
+Usage:
+    python -m src.live URL_OR_PLAYLIST [--output DIR]
+    python -m src.live --test-stream          # local HLS stream generated by FFmpeg
+"""
+import argparse
+import csv
+import math
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import soundfile
+import torch
+from src.config import Config
+from src.separator import load_model, separate_tensor, two_stem_split
+from src.settings import Settings
+from src.temp_manager import TempManager
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+
+class PcmBuffer:
+    """Growing PCM buffer fed by the ingest process, remembering when samples arrived"""
+
+    def __init__(self, samplerate=SAMPLE_RATE, channels=CHANNELS):
+        self.samplerate = samplerate
+        self.channels = channels
+        self._data = np.zeros((channels, 0), dtype=np.float32)
+        self._offset = 0          # Absolute index of self._data[:, 0]
+        self._arrivals = []       # (absolute sample count, wall time)
+        self._finished = False
+        self._condition = threading.Condition()
+
+    @property
+    def available(self):
+        with self._condition:
+            return self._offset + self._data.shape[1]
+
+    @property
+    def finished(self):
+        with self._condition:
+            return self._finished
+
+    def feed(self, raw):
+        """Append interleaved s16le bytes"""
+        frames = np.frombuffer(raw, dtype='<i2').reshape(-1, self.channels).T
+        with self._condition:
+            self._data = np.concatenate([self._data, frames.astype(np.float32) / 32768], axis=1)
+            self._arrivals.append((self._offset + self._data.shape[1], time.time()))
+            self._condition.notify_all()
+
+    def finish(self):
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+
+    def wait_for(self, sample):
+        """Block until `sample` has arrived or the stream ended"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._finished or self._offset + self._data.shape[1] >= sample
+            )
+
+    def read(self, start, end):
+        """Samples [start, end) as (channels, n), zero padded outside the buffered range"""
+        out = np.zeros((self.channels, max(0, end - start)), dtype=np.float32)
+        with self._condition:
+            lo = max(start, self._offset)
+            hi = min(end, self._offset + self._data.shape[1])
+            if hi > lo:
+                out[:, lo - start:hi - start] = self._data[:, lo - self._offset:hi - self._offset]
+        return out
+
+    def arrival_time(self, sample):
+        """Wall time at which a sample arrived (None if it hasn't)"""
+        with self._condition:
+            for count, arrived in self._arrivals:
+                if count > sample:
+                    return arrived
+        return None
+
+    def trim(self, before):
+        """Drop samples older than `before` to bound memory"""
+        with self._condition:
+            drop = min(max(0, before - self._offset), self._data.shape[1])
+            if drop:
+                self._data = self._data[:, drop:]
+                self._offset += drop
+            self._arrivals = [a for a in self._arrivals if a[0] > self._offset]
+
+
+class LiveMusicRemover:
+    def __init__(self, source, output_dir=None, segment_seconds=None, context_seconds=None,
+                 lookahead_seconds=None, playlist_size=None, realtime=None,
+                 status_callback=None, model=None, settings=None):
+        """
+        Args:
+            source: Live/HLS URL or local playlist/file
+            output_dir: Directory for the cleaned playlist (index.m3u8) and segments
+            segment_seconds: Published segment length
+            context_seconds: Past audio fed to the model with each segment
+            lookahead_seconds: Future audio waited for before separating a segment
+            playlist_size: Segments listed in the rolling playlist
+            realtime: Read the source at its native rate (defaults to True for local files)
+            status_callback: Callback for status/latency messages
+            model: Already loaded Demucs model (loaded from settings if not given)
+            settings: Optional Settings (model and stems)
+        """
+        self.source = str(source)
+        self.output_dir = Path(output_dir or Config.LIVE_OUTPUT_DIR)
+        self.segment_seconds = segment_seconds or Config.LIVE_SEGMENT_SECONDS
+        self.context_seconds = Config.LIVE_CONTEXT_SECONDS if context_seconds is None else context_seconds
+        self.lookahead_seconds = Config.LIVE_LOOKAHEAD_SECONDS if lookahead_seconds is None else lookahead_seconds
+        self.playlist_size = playlist_size or Config.LIVE_PLAYLIST_SIZE
+        self.realtime = os.path.exists(self.source) if realtime is None else realtime
+        self.status_callback = status_callback
+        self.model = model
+        self.settings = settings or Settings.load()
+
+        self.buffer = PcmBuffer()
+        self.latencies = []
+        self._published = []      # (sequence, filename, duration)
+        self._ingest = None
+        self._stop = threading.Event()
+
+    def _status(self, text):
+        if self.status_callback:
+            self.status_callback(text)
+
+    def _ingest_command(self, ingest_dir):
+        """Split the video into copied segments and stream the audio as raw PCM"""
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+        if self.realtime:
+            command.append('-re')
+        return command + [
+            '-i', self.source,
+            '-map', '0:v:0', '-c:v', 'copy',
+            '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_format', 'mpegts',
+            '-segment_list', str(ingest_dir / 'segments.csv'),
+            '-segment_list_type', 'csv',
+            '-reset_timestamps', '1',
+            str(ingest_dir / 'seg_%06d.ts'),
+            '-map', '0:a:0',
+            '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ar', str(SAMPLE_RATE), '-ac', str(CHANNELS),
+            'pipe:1'
+        ]
+
+    def _mux_command(self, video_segment, audio_path, output_path, start):
+        """Mux a cleaned audio window with the untouched video segment at its stream time"""
+        return [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-i', str(video_segment),
+            '-i', str(audio_path),
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy',
+            '-c:a', 'aac', '-b:a', '192k',
+            '-output_ts_offset', f"{start:.6f}",
+            '-muxdelay', '0', '-muxpreload', '0',
+            '-shortest',
+            '-f', 'mpegts',
+            '-y', str(output_path)
+        ]
+
+    def _read_audio(self):
+        """Feed ingest stdout into the PCM buffer"""
+        block = SAMPLE_RATE * CHANNELS * 2 // 10  # 100 ms
+        try:
+            while True:
+                raw = self._ingest.stdout.read(block)
+                if not raw:
+                    break
+                # Keep whole frames only
+                usable = len(raw) - len(raw) % (CHANNELS * 2)
+                self.buffer.feed(raw[:usable])
+        finally:
+            self.buffer.finish()
+
+    def _new_segments(self, list_path, seen):
+        """Segments the ingest finished since the last call, as (name, start, end)"""
+        if not list_path.exists():
+            return []
+        # Ignore a line the ingest may still be writing
+        lines = list_path.read_text(encoding='utf-8').split('\n')[:-1]
+        rows = [row for row in csv.reader(lines) if len(row) == 3]
+        return [(name, float(start), float(end)) for name, start, end in rows[seen:]]
+
+    def _separate_window(self, start, end):
+        """Separate [start - context, end + lookahead) and keep only [start, end)"""
+        sr = SAMPLE_RATE
+        first, last = round(start * sr), round(end * sr)
+        context = round(self.context_seconds * sr)
+        lookahead = round(self.lookahead_seconds * sr)
+
+        self.buffer.wait_for(last + lookahead)
+        window = self.buffer.read(max(0, first - context), last + lookahead)
+        lead = first - max(0, first - context)
+
+        stems = two_stem_split(
+            separate_tensor(self.model, torch.from_numpy(window), shifts=0), self.settings.demucs_two_stems
+        )
+        cleaned = stems[self.settings.demucs_two_stems][:, lead:lead + (last - first)]
+        self.buffer.trim(first - context)
+        return cleaned.clamp(-1, 1).numpy().T
+
+    def _publish(self, sequence, name, duration, ended=False):
+        """Add a segment to the rolling playlist and drop segments that fell out of it"""
+        if name:
+            self._published.append((sequence, name, duration))
+
+        listed = self._published[-self.playlist_size:]
+        # Keep a few expired segments around for clients still downloading them
+        for _, old_name, _ in self._published[:-self.playlist_size * 2]:
+            (self.output_dir / old_name).unlink(missing_ok=True)
+        self._published = self._published[-self.playlist_size * 2:]
+
+        target = math.ceil(max([d for _, _, d in listed] or [self.segment_seconds]))
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{target}',
+            f'#EXT-X-MEDIA-SEQUENCE:{listed[0][0] if listed else 0}',
+        ]
+        for _, seg_name, seg_duration in listed:
+            lines += [f'#EXTINF:{seg_duration:.3f},', seg_name]
+        if ended:
+            lines.append('#EXT-X-ENDLIST')
+
+        playlist = self.output_dir / 'index.m3u8'
+        tmp = playlist.with_suffix('.m3u8.tmp')
+        tmp.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        os.replace(tmp, playlist)
+
+    def _process_segment(self, work_dir, sequence, name, start, end):
+        """Clean one segment and publish it, recording its end-to-end latency"""
+        cleaned = self._separate_window(start, end)
+        audio_path = work_dir / f"clean_{sequence:06d}.wav"
+        soundfile.write(str(audio_path), cleaned, SAMPLE_RATE, subtype='PCM_16')
+
+        video_segment = work_dir / 'ingest' / name
+        output_name = f"seg_{sequence:06d}.ts"
+        subprocess.run(
+            self._mux_command(video_segment, audio_path, self.output_dir / output_name, start),
+            check=True, capture_output=True
+        )
+        audio_path.unlink(missing_ok=True)
+        video_segment.unlink(missing_ok=True)
+
+        self._publish(sequence, output_name, end - start)
+
+        # From the arrival of the segment's first sample to its publication
+        arrived = self.buffer.arrival_time(round(start * SAMPLE_RATE))
+        if arrived is not None:
+            latency = time.time() - arrived
+            self.latencies.append(latency)
+            message = f"Segment {sequence}: latency {latency:.1f}s"
+            if latency > Config.LIVE_TARGET_LATENCY:
+                message += f" (above target {Config.LIVE_TARGET_LATENCY}s)"
+            self._status(message)
+
+    def run(self):
+        """
+        Run until the source ends or stop() is called
+
+        Returns:
+            Path to the published playlist
+        """
+        Config.setup_directories()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        if self.model is None:
+            self._status(f"Loading {self.settings.demucs_model}...")
+            self.model = load_model(self.settings.demucs_model)
+
+        temp_manager = TempManager(self.status_callback)
+        # Scratch holds a few segments of video and audio at a time
+        required_bytes = temp_manager.estimate_scratch_bytes(self.segment_seconds * 4)
+        with temp_manager.job_dir(required_bytes) as work_dir:
+            ingest_dir = work_dir / 'ingest'
+            ingest_dir.mkdir()
+            list_path = ingest_dir / 'segments.csv'
+
+            self._status(f"Ingesting {self.source}...")
+            # stderr goes to a file so a chatty FFmpeg can never block on a full pipe
+            ingest_errors = tempfile.TemporaryFile()
+            self._ingest = subprocess.Popen(
+                self._ingest_command(ingest_dir), stdout=subprocess.PIPE, stderr=ingest_errors
+            )
+            reader = threading.Thread(target=self._read_audio, daemon=True)
+            reader.start()
+
+            sequence = 0
+            try:
+                while not self._stop.is_set():
+                    segments = self._new_segments(list_path, sequence)
+                    for name, start, end in segments:
+                        self._process_segment(work_dir, sequence, name, start, end)
+                        sequence += 1
+
+                    if not segments:
+                        if self._ingest.poll() is not None and not self._new_segments(list_path, sequence):
+                            break
+                        time.sleep(0.1)
+            finally:
+                if self._ingest.poll() is None:
+                    self._ingest.terminate()
+                    self._ingest.wait()
+                reader.join(timeout=5)
+                ingest_errors.seek(0)
+                stderr = ingest_errors.read().decode(errors='replace').strip()
+                ingest_errors.close()
+
+            # A failed ingest must not be published as a normally ended stream
+            if self._ingest.returncode and not self._stop.is_set():
+                raise RuntimeError(
+                    f"Ingest of {self.source} failed (exit code {self._ingest.returncode}): "
+                    f"{stderr[-2000:] or 'no error output'}"
+                )
+
+        self._publish(sequence, None, 0, ended=True)
+        if self.latencies:
+            self._status(
+                f"Live mode ended: {len(self.latencies)} segments, latency "
+                f"avg {sum(self.latencies) / len(self.latencies):.1f}s, max {max(self.latencies):.1f}s"
+            )
+        return self.output_dir / 'index.m3u8'
+
+    def stop(self):
+        """Stop after the current segment"""
+        self._stop.set()
+
+
+def generate_test_stream(output_dir, duration=60, segment_seconds=2):
+    """
+    Generate a local HLS stream with FFmpeg (test pattern video, tone + noise audio)
+
+    Serve it from disk by passing the returned playlist to LiveMusicRemover, which
+    reads local sources at their native rate to simulate a live stream.
+
+    Returns:
+        Path to the generated playlist
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    playlist = output_dir / 'index.m3u8'
+    command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f"testsrc2=size=640x360:rate=25:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        '-f', 'lavfi', '-i', f"anoisesrc=color=pink:amplitude=0.1:sample_rate=44100:duration={duration}",
+        '-filter_complex', '[1:a][2:a]amix=inputs=2[a]',
+        '-map', '0:v', '-map', '[a]',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(25 * segment_seconds),
+        '-c:a', 'aac', '-ac', '2',
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+        '-y', str(playlist)
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+    return playlist
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove music from a live or HLS stream")
+    parser.add_argument('source', nargs='?', help="stream URL or local playlist")
+    parser.add_argument('--output', help=f"output directory (default {Config.LIVE_OUTPUT_DIR})")
+    parser.add_argument('--segment', type=float, help="segment length in seconds")
+    parser.add_argument('--context', type=float, help="past audio context in seconds")
+    parser.add_argument('--lookahead', type=float, help="lookahead in seconds")
+    parser.add_argument('--test-stream', action='store_true',
+                        help="generate a local HLS test stream with FFmpeg and process it")
+    parser.add_argument('--duration', type=int, default=60, help="test stream length in seconds")
+    args = parser.parse_args()
+
+    source = args.source
+    if args.test_stream:
+        source = generate_test_stream(Config.OUTPUT_DIR / 'live_test_stream', args.duration)
+        print(f"Test stream: {source}")
+    if not source:
+        parser.error("a source is required (or use --test-stream)")
+
+    remover = LiveMusicRemover(
+        source, args.output, args.segment, args.context, args.lookahead, status_callback=print
+    )
+    try:
+        playlist = remover.run()
+    except KeyboardInterrupt:
+        remover.stop()
+        return
+    print(f"Playlist: {playlist}")
+
+
+if __name__ == "__main__":
+    main()
@@ -52,6 +52,10 @@ setup_ffmpeg_path()
 from src.config import Config
 from src.downloader import VideoDownloader
 from src.music_remover import MusicRemover
+from src.profiling import JobProfiler
+from src.settings import Settings
+from src.temp_manager import TempManager
+from src.time_ranges import parse_time_ranges, format_timestamp
 
 class VideoDownloaderApp:
     def __init__(self, root):
@@ -67,6 +71,16 @@ class VideoDownloaderApp:
         # Setup directories
         Config.setup_directories()
 
+        # Remove temp files left by crashed runs, now and periodically
+        self.temp_manager = TempManager()
+        self.temp_manager.start_janitor()
+
+        # Separation workers sharing one copy of each model (started on first use)
+        self.separator = None
+        if Config.SEPARATION_WORKERS:
+            from src.separator import ModelPools
+            self.separator = ModelPools()
+
         # Processing state
         self.is_processing = False
         self.current_video_path = None
@@ -266,6 +280,32 @@ class VideoDownloaderApp:
         self.format_entry.pack(fill=tk.X, pady=5, ipady=3)
         self.format_entry.insert(0, Config.YTDLP_FORMAT)
 
+        # Time Range Frame
+        range_frame = tk.Frame(main_container, bg=self.bg_color)
+        range_frame.pack(fill=tk.X, pady=5)
+
+        range_label = tk.Label(
+            range_frame,
+            text="⏱ Time Ranges (optional, e.g. 10:00-25:00, 1:02:00-1:05:30):",
+            font=("Segoe UI", 9),
+            bg=self.bg_color,
+            fg=self.secondary_text
+        )
+        range_label.pack(anchor=tk.W)
+
+        self.range_entry = tk.Entry(
+            range_frame,
+            font=("Segoe UI", 9),
+            relief=tk.FLAT,
+            bd=2,
+            highlightthickness=1,
+            highlightbackground="#cccccc" if not self.dark_mode else "#444444",
+            highlightcolor=self.accent_color,
+            bg=self.log_bg,
+            fg=self.log_text_color
+        )
+        self.range_entry.pack(fill=tk.X, pady=5, ipady=3)
+
         # Buttons Frame
         button_frame = tk.Frame(main_container, bg=self.bg_color)
         button_frame.pack(pady=12)
@@ -418,7 +458,7 @@ class VideoDownloaderApp:
                         pass
 
                 elif msg_type == 'complete':
-                    self.on_processing_complete(msg_data)
+                    self.on_processing_complete(*msg_data)
 
                 elif msg_type == 'error':
                     self.on_processing_error(msg_data)
@@ -440,6 +480,12 @@ class VideoDownloaderApp:
             messagebox.showerror("Error", "Please enter a video URL")
             return
 
+        try:
+            time_ranges = parse_time_ranges(self.range_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid time ranges:\n\n{e}")
+            return
+
         self.is_processing = True
         self.process_btn.config(state=tk.DISABLED, text="⏳ Processing...")
         self.progress_bar['value'] = 0
@@ -450,6 +496,10 @@ class VideoDownloaderApp:
         
         self.log("="*60)
         self.log(f"Starting process for URL: {url}")
+        if time_ranges:
+            self.log("Time ranges: " + ", ".join(
+                f"{format_timestamp(start)}-{format_timestamp(end)}" for start, end in time_ranges
+            ))
         self.log("="*60)
 
         # Get custom format if specified
@@ -460,81 +510,167 @@ class VideoDownloaderApp:
         # Start processing in background thread
         thread = threading.Thread(
             target=self.process_video,
-            args=(url, custom_format),
+            args=(url, custom_format, time_ranges),
             daemon=True
         )
         thread.start()
 
-    def process_video(self, url, custom_format):
+    def process_video(self, url, custom_format, time_ranges=None):
         """Process video: download and remove music (runs in background thread)"""
         try:
-            # Phase 1: Download video
+            self.profiler = JobProfiler(f"job_{int(time.time())}")
+            # Snapshot the settings so edits to the settings file only affect later jobs
+            self.settings = Settings.load()
+        except Exception as e:
+            # e.g. an invalid settings file or HVMR_* value
+            self._report_error(e)
+            return
+
+        with self.profiler:
+            self._process_video(url, custom_format, time_ranges)
+
+        if self.profiler.enabled:
+            self.log(f"Profile bundle: {self.profiler.bundle_dir}")
+
+    def _process_video(self, url, custom_format, time_ranges=None):
+        """Download and remove music, reporting completion or errors to the GUI"""
+        try:
+            # Phase 1: Download video(s)
             self.log("\n[PHASE 1] DOWNLOADING VIDEO")
             self.log("-" * 60)
 
             downloader = VideoDownloader(
                 progress_callback=lambda p: self.update_progress(p * 0.5),
-                status_callback=lambda s: self.update_status(s)
+                status_callback=lambda s: self.update_status(s),
+                profiler=self.profiler,
+                settings=self.settings
             )
 
-            video_path = downloader.download(url, custom_format)
-            self.current_video_path = video_path
+            entry_urls = downloader.expand_url(url)
+
+            if len(entry_urls) > 1:
+                self.log(f"Playlist/channel with {len(entry_urls)} videos")
 
-            self.log(f"Downloaded: {video_path}")
+                # Per-entry progress stays on the status line; milestones go to the log
+                downloader.log_callback = self.log
+                downloads = downloader.download_playlist(
+                    url, custom_format, time_ranges=time_ranges, entry_urls=entry_urls
+                )
+                if not downloads:
+                    self.log("No new videos to process (all are in the download archive).")
+            else:
+                video_path = downloader.download(url, custom_format, time_ranges=time_ranges)
+                downloads = [(video_path, downloader.sections_downloaded, downloader.audio_file)]
 
-            # Rename to safe ASCII filename
-            video_path = Path(video_path)
-            safe_name = f"video_{int(time.time())}_{random.randint(1000,9999)}{video_path.suffix}"
-            safe_path = video_path.parent / safe_name
-            
-            video_path.rename(safe_path)
-            video_path = safe_path
-            
-            self.log(f"Renamed to safe filename: {video_path.name}")
+            if time_ranges and not all(sections for _, sections, _ in downloads):
+                self.log("Some sections could not be downloaded directly; they will be cut locally.")
 
             # Phase 2: Remove music
             self.log("\n[PHASE 2] REMOVING MUSIC")
             self.log("-" * 60)
 
-            remover = MusicRemover(
-                progress_callback=lambda p: self.update_progress(50 + p * 0.5),
-                status_callback=lambda s: self.update_status(s)
-            )
-
-            output_path = remover.remove_music(video_path)
-
-            self.log(f"Output saved: {output_path}")
+            output_path = None
+            total = len(downloads)
+            for index, (video_path, sections_downloaded, audio_path) in enumerate(downloads):
+                if total > 1:
+                    self.log(f"\nVideo {index + 1}/{total}")
+
+                # Sections fetched by yt-dlp are already trimmed; otherwise cut locally
+                output_path = self._remove_music_from(
+                    video_path,
+                    lambda p, i=index: self.update_progress(50 + (i + p / 100) * 50 / total),
+                    None if sections_downloaded else time_ranges,
+                    audio_path
+                )
+
+            failed = downloader.playlist_errors
             self.log("\n" + "="*60)
-            self.log("✅ PROCESS COMPLETED SUCCESSFULLY!")
+            if failed:
+                self.log(f"⚠️ PROCESS COMPLETED, {len(failed)} DOWNLOAD(S) FAILED:")
+                for failed_url, error in failed:
+                    self.log(f"  {failed_url}: {error}")
+            else:
+                self.log("✅ PROCESS COMPLETED SUCCESSFULLY!")
             self.log("="*60)
 
             # Send completion message
-            self.message_queue.put(('complete', output_path))
+            self.message_queue.put(('complete', (output_path or Config.OUTPUT_DIR, failed)))
 
         except Exception as e:
-            import traceback
-            error_msg = f"Error: {str(e)}"
-            full_trace = traceback.format_exc()
-            
-            self.log(f"\n{'='*60}")
-            self.log(f"❌ ERROR: {error_msg}")
-            self.log(f"\nFull traceback:")
-            self.log(full_trace)
-            self.log("="*60)
-            self.message_queue.put(('error', error_msg))
+            self._report_error(e)
+
+    def _report_error(self, e):
+        """Log an exception from the worker thread and tell the GUI the job failed"""
+        import traceback
+        error_msg = f"Error: {str(e)}"
+        full_trace = traceback.format_exc()
+
+        self.log(f"\n{'='*60}")
+        self.log(f"❌ ERROR: {error_msg}")
+        self.log(f"\nFull traceback:")
+        self.log(full_trace)
+        self.log("="*60)
+        self.message_queue.put(('error', error_msg))
+
+    def _remove_music_from(self, video_path, progress_callback, time_ranges=None, audio_path=None):
+        """Rename a downloaded video (and its separate audio) to a safe filename and remove its music"""
+        self.current_video_path = video_path
+        self.log(f"Downloaded: {video_path}")
 
-    def on_processing_complete(self, output_path):
-        """Handle successful completion"""
+        # Rename to safe ASCII filename
+        video_path = Path(video_path)
+        safe_name = f"video_{int(time.time())}_{random.randint(1000,9999)}{video_path.suffix}"
+        safe_path = video_path.parent / safe_name
+        
+        video_path.rename(safe_path)
+        video_path = safe_path
+        
+        self.log(f"Renamed to safe filename: {video_path.name}")
+
+        if audio_path:
+            audio_path = Path(audio_path)
+            safe_audio_path = video_path.with_name(f"{video_path.stem}_audio{audio_path.suffix}")
+            audio_path.rename(safe_audio_path)
+            audio_path = safe_audio_path
+            self.log(f"Separate audio stream: {audio_path.name}")
+
+        remover = MusicRemover(
+            progress_callback=progress_callback,
+            status_callback=lambda s: self.update_status(s),
+            temp_manager=self.temp_manager,
+            separator=self.separator,
+            profiler=self.profiler,
+            settings=self.settings
+        )
+
+        output_path = remover.remove_music(video_path, time_ranges, audio_path=audio_path)
+
+        self.log(f"Output saved: {output_path}")
+        return output_path
+
+    def on_processing_complete(self, output_path, failed=()):
+        """Handle completion; failed lists (url, error) of playlist entries that failed"""
         self.is_processing = False
         self.process_btn.config(state=tk.NORMAL, text="▶ Download & Remove Music")
         self.progress_bar['value'] = 100
-        self.update_status("✅ Completed successfully!")
 
-        response = messagebox.askyesno(
-            "Success!",
-            f"Video processed successfully! If I helped you in any way, you can make a donation by pressing Support Developer. \n\nOutput: {Path(output_path).name}\n\nDo you want to open the output folder?",
-            icon='info'
-        )
+        if failed:
+            self.update_status(f"⚠️ Completed, {len(failed)} download(s) failed")
+            failed_urls = "\n".join(failed_url for failed_url, _ in failed[:5])
+            if len(failed) > 5:
+                failed_urls += f"\n... and {len(failed) - 5} more (see the Activity Log)"
+            response = messagebox.askyesno(
+                "Completed with errors",
+                f"{len(failed)} video(s) could not be downloaded:\n\n{failed_urls}\n\nOutput: {Path(output_path).name}\n\nDo you want to open the output folder?",
+                icon='warning'
+            )
+        else:
+            self.update_status("✅ Completed successfully!")
+            response = messagebox.askyesno(
+                "Success!",
+                f"Video processed successfully! If I helped you in any way, you can make a donation by pressing Support Developer. \n\nOutput: {Path(output_path).name}\n\nDo you want to open the output folder?",
+                icon='info'
+            )
 
         if response:
             self.open_output_folder()
@@ -576,6 +712,14 @@ class VideoDownloaderApp:
             )
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Video Downloader & Music Remover")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"write a profile bundle for every job to {Config.PROFILE_DIR}")
+    args = parser.parse_args()
+    if args.profile:
+        Config.PROFILE_JOBS = True
+
     root = tk.Tk()
     app = VideoDownloaderApp(root)
     root.mainloop()
@@ -5,6 +5,11 @@ import subprocess
 import shutil
 from pathlib import Path
 from src.config import Config
+from src.format_policy import OUTPUT_CONTAINER, is_copyable
+from src.profiling import JobProfiler
+from src.settings import Settings
+from src.temp_manager import TempManager
+from src.time_ranges import format_timestamp
 import ffmpeg
 import os
 
@@ -12,164 +17,486 @@ import os
 os.environ['TORCHAUDIO_BACKEND'] = 'soundfile'
 
 class MusicRemover:
-    def __init__(self, progress_callback=None, status_callback=None):
+    def __init__(self, progress_callback=None, status_callback=None, temp_manager=None, separator=None,
+                 profiler=None, settings=None):
         self.progress_callback = progress_callback
         self.status_callback = status_callback
-
-    def remove_music(self, video_path):
+        self.temp_manager = temp_manager or TempManager(status_callback)
+        # Frozen per-job settings; Config/file/env defaults if not given
+        self.settings = settings or Settings.load()
+        # Optional SharedModelPool or ModelPools; without a pool for the job's model
+        # each job runs the Demucs CLI
+        self.separator = separator.for_settings(self.settings) if separator else None
+        # JobProfiler of the surrounding job; one is created per call if not given
+        self.profiler = profiler
+        self.work_dir = Config.TEMP_DIR
+
+    def remove_music(self, video_path, time_ranges=None, audio_tracks=None, audio_path=None):
         """
         Remove music from video, keeping only vocals and other sounds
 
         Args:
             video_path: Path to input video file
+            time_ranges: Optional list of (start, end) seconds. Only these sections are
+                extracted, separated and muxed; the output is the sections joined in order.
+            audio_tracks: Optional audio tracks to process, by audio stream index or
+                language code (defaults to settings.audio_tracks, None = all tracks)
+            audio_path: Optional separately downloaded audio stream. Audio is read from
+                it and only the video stream is taken from video_path, so the source
+                video is written once, by the final mux.
 
         Returns:
             Path to output video without music
         """
-        video_path = Path(video_path)
+        video_path, audio_path = self._input_paths(video_path, audio_path)
+        Config.setup_directories()
 
+        if self.profiler is None:
+            self.profiler = JobProfiler(video_path.stem)
+            try:
+                with self.profiler:
+                    return self._remove_music(video_path, time_ranges, audio_tracks, audio_path)
+            finally:
+                self.profiler = None
+        return self._remove_music(video_path, time_ranges, audio_tracks, audio_path)
+
+    def _input_paths(self, video_path, audio_path=None):
+        """Check the inputs exist; returns (video_path, audio_path) with the video as audio source by default"""
+        video_path = Path(video_path)
         if not video_path.exists():
             raise FileNotFoundError(f"Video file not found: {video_path}")
 
-        Config.setup_directories()
+        audio_path = Path(audio_path) if audio_path else video_path
+        if not audio_path.exists():
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+        return video_path, audio_path
 
-        # Step 1: Extract audio from video
-        if self.status_callback:
-            self.status_callback("Step 1/4: Extracting audio from video...")
-        if self.progress_callback:
-            self.progress_callback(10)
+    def _prepare(self, video_path, time_ranges=None, audio_tracks=None, audio_path=None):
+        """Probe the audio source; returns (tracks, scratch bytes the job needs)"""
+        audio_path = audio_path or video_path
+        probe = self._probe(audio_path)
+        tracks = self._audio_tracks(probe, audio_tracks)
+        return tracks, self._estimate_scratch_bytes(video_path, probe, time_ranges, len(tracks))
 
-        audio_path = self._extract_audio(video_path)
+    def _remove_music(self, video_path, time_ranges=None, audio_tracks=None, audio_path=None):
+        """Run the job in its own scratch directory"""
+        tracks, required_bytes = self._prepare(video_path, time_ranges, audio_tracks, audio_path)
+
+        # Intermediates live in a per-job directory that is removed even if a step fails
+        with self.temp_manager.job_dir(required_bytes) as work_dir:
+            self.work_dir = work_dir
+            output_path = self._process(video_path, tracks, time_ranges, audio_path)
 
-        # Step 2: Separate audio using Demucs
         if self.status_callback:
-            self.status_callback("Step 2/4: Separating audio (this may take a while)...")
+            self.status_callback("Music removal completed!")
         if self.progress_callback:
-            self.progress_callback(30)
+            self.progress_callback(100)
 
-        vocals_path = self._separate_audio(audio_path)
+        return output_path
 
-        # Step 3: Combine video with vocals-only audio
-        if self.status_callback:
-            self.status_callback("Step 3/4: Combining video with processed audio...")
-        if self.progress_callback:
-            self.progress_callback(70)
+    def _process(self, video_path, tracks, time_ranges=None, audio_path=None):
+        """Run extraction, separation and muxing inside the current work dir"""
+        return self._drive(self._steps(video_path, tracks, time_ranges, audio_path))
 
-        output_path = self._combine_video_audio(video_path, vocals_path)
+    def _drive(self, steps):
+        """Execute the steps of a _steps() generator, blocking; returns its result"""
+        try:
+            step = next(steps)
+            while True:
+                step = steps.send(self._run_step(step))
+        except StopIteration as done:
+            return done.value
+        finally:
+            # Runs the generator's cleanup if a step failed
+            steps.close()
+
+    def _run_step(self, step):
+        """Execute one step and return what the generator is sent back"""
+        kind, *args = step
+        if kind == 'report':
+            status, percent = args
+            if self.status_callback:
+                self.status_callback(status)
+            if self.progress_callback:
+                self.progress_callback(percent)
+        elif kind == 'run':
+            for command in args[0]:
+                self.profiler.run(command)
+        elif kind == 'separate':
+            return self._separate_audio(*args)
+        elif kind == 'call':
+            function, *call_args = args
+            return function(*call_args)
+        else:
+            raise ValueError(f"Unknown step: {kind}")
+
+    def _steps(self, video_path, tracks, time_ranges=None, audio_path=None):
+        """
+        The job as a sequence of steps, shared with AsyncMusicRemover
 
-        # Step 4: Cleanup
-        if self.status_callback:
-            self.status_callback("Step 4/4: Cleaning up temporary files...")
-        if self.progress_callback:
-            self.progress_callback(90)
+        A generator that yields what to do next and is sent back the result. Paths,
+        command lines and progress messages are all decided here; the caller only
+        decides how a step executes (blocking in _run_step, awaited in the asyncio
+        pipeline), so both implementations always do the same work.
 
-        self._cleanup(audio_path, vocals_path)
+        Yields:
+            ('report', status, percent)
+            ('run', commands): FFmpeg command lines that may run concurrently
+            ('separate', audio_paths, video_path): sent back the vocals paths
+            ('call', function, *args): blocking Python work; sent back its result
 
-        if self.status_callback:
-            self.status_callback("Music removal completed!")
-        if self.progress_callback:
-            self.progress_callback(100)
+        Returns:
+            Path to output video without music
+        """
+        audio_path = audio_path or video_path
+
+        # Step 1: Extract audio from video
+        yield ('report', f"Step 1/4: {self._extract_status(tracks, time_ranges)}", 10)
+        audio_groups = yield from self._extract_steps(video_path, tracks, time_ranges, audio_path)
+        audio_paths = [path for group in audio_groups for path in group]
+
+        # Step 2: Separate audio using Demucs
+        yield ('report', "Step 2/4: Separating audio (this may take a while)...", 30)
+        vocals_paths = yield ('separate', audio_paths, video_path)
+        vocals_groups = [
+            vocals_paths[i:i + len(tracks)] for i in range(0, len(vocals_paths), len(tracks))
+        ]
 
+        # Step 3: Combine video with vocals-only audio
+        yield ('report', "Step 3/4: Combining video with processed audio...", 70)
+        output_path = yield from self._combine_steps(video_path, vocals_groups, tracks, time_ranges, audio_path)
+
+        # Step 4: Cleanup (the work dir is removed when the job dir block exits)
+        yield ('report', "Step 4/4: Cleaning up temporary files...", 90)
         return output_path
 
-    def _extract_audio(self, video_path):
-        """Extract audio from video using FFmpeg"""
-        audio_path = Config.TEMP_DIR / f"{video_path.stem}_audio.wav"
+    def _extract_steps(self, video_path, tracks, time_ranges=None, source_path=None):
+        """Steps extracting the selected tracks of every section; returns the WAV paths per section
+
+        One FFmpeg pass per section extracts every track. Audio is read from
+        source_path (a separately downloaded audio stream) if given, otherwise from
+        the video; temp files are named after the video either way.
+        """
+        sections = time_ranges or [None]
+        audio_groups = [
+            [self._audio_path(video_path, index if time_ranges else None, track['index']) for track in tracks]
+            for index in range(len(sections))
+        ]
+        yield ('run', [
+            self._extract_audio_command(source_path or video_path, tracks, group, section)
+            for section, group in zip(sections, audio_groups)
+        ])
+        return audio_groups
+
+    def _extract_status(self, tracks, time_ranges=None):
+        """Describe what step 1 extracts"""
+        what = "audio" if len(tracks) == 1 else f"{len(tracks)} audio tracks"
+        if time_ranges:
+            spans = ", ".join(f"{format_timestamp(s)}-{format_timestamp(e)}" for s, e in time_ranges)
+            return f"Extracting {what} for {spans}..."
+        return f"Extracting {what} from video..."
+
+    def _estimate_scratch_bytes(self, video_path, probe=None, time_ranges=None, track_count=1):
+        """Estimate a job's temp space from the duration that will be processed"""
+        duration = self._probe_duration(probe)
+        if duration is None:
+            # Unknown duration: assume the audio decodes to a few times the file size
+            return self.temp_manager.estimate_scratch_bytes(
+                0, video_path.stat().st_size * 4 * track_count, self.settings.temp_space_headroom
+            )
+
+        part_bytes = 0
+        if time_ranges:
+            processed = sum(min(end if end is not None else duration, duration) - start
+                            for start, end in time_ranges)
+            # Re-encoded section parts are roughly proportional to the source bitrate
+            part_bytes = video_path.stat().st_size * processed / max(duration, 1)
+            duration = max(processed, 0)
+
+        return self.temp_manager.estimate_scratch_bytes(
+            duration * track_count, part_bytes, self.settings.temp_space_headroom
+        )
 
+    def _probe(self, video_path):
+        """ffprobe information for a file, or None if it can't be probed"""
+        try:
+            return ffmpeg.probe(str(video_path))
+        except Exception:
+            return None
+
+    def _probe_duration(self, probe):
+        """Media duration in seconds from probe information, or None"""
+        try:
+            return float(probe['format']['duration'])
+        except (TypeError, KeyError, ValueError):
+            return None
+
+    def _audio_tracks(self, probe, audio_tracks=None):
+        """
+        Audio tracks to process
+
+        Args:
+            probe: ffprobe information (None falls back to the first audio track)
+            audio_tracks: Audio stream indices and/or language codes, None for all
+
+        Returns:
+            List of dicts with 'index' (audio stream index) and 'default'
+        """
+        selection = audio_tracks if audio_tracks is not None else self.settings.audio_tracks
+
+        if probe is None:
+            return [{'index': 0, 'default': True}]
+
+        streams = [s for s in probe.get('streams', []) if s.get('codec_type') == 'audio']
+        if not streams:
+            raise ValueError("No audio track found in video")
+
+        tracks = [
+            {
+                'index': index,
+                'language': (stream.get('tags') or {}).get('language'),
+                'default': bool((stream.get('disposition') or {}).get('default')),
+            }
+            for index, stream in enumerate(streams)
+        ]
+
+        if selection:
+            wanted = [str(item).lower() for item in selection]
+            tracks = [
+                track for track in tracks
+                if str(track['index']) in wanted or (track['language'] or '').lower() in wanted
+            ]
+            if not tracks:
+                raise ValueError(f"None of the requested audio tracks were found: {selection}")
+
+        # Exactly one output track is marked default
+        if not any(track['default'] for track in tracks):
+            tracks[0]['default'] = True
+        else:
+            first_default = next(track for track in tracks if track['default'])
+            for track in tracks:
+                track['default'] = track is first_default
+
+        return tracks
+
+    def _audio_path(self, video_path, index=None, track=0):
+        """Temp WAV path for one audio track of a video (or of one of its sections)"""
+        suffix = f"_{index}" if index is not None else ""
+        return self.work_dir / f"{video_path.stem}_audio{suffix}_a{track}.wav"
+
+    def _extract_audio_command(self, source_path, tracks, audio_paths, section=None):
+        """FFmpeg command line extracting each track of a video or audio file to its own WAV"""
         try:
             # Using ffmpeg-python
-            (
-                ffmpeg
-                .input(str(video_path))
-                .output(str(audio_path), acodec='pcm_s16le', ac=2, ar='44100')
-                .overwrite_output()
-                .run(quiet=True, capture_stderr=True)
-            )
-        except Exception as e:
-            # Fallback to subprocess
-            command = [
-                'ffmpeg', '-i', str(video_path),
+            source = ffmpeg.input(str(source_path), **self._section_args(section))
+            return ffmpeg.merge_outputs(*[
+                source[f"a:{track['index']}"].output(str(audio_path), acodec='pcm_s16le', ac=2, ar='44100')
+                for track, audio_path in zip(tracks, audio_paths)
+            ]).overwrite_output().compile()
+        except Exception:
+            pass
+
+        # Fallback to a hand-built command line
+        command = ['ffmpeg', *self._section_flags(section), '-i', str(source_path)]
+        for track, audio_path in zip(tracks, audio_paths):
+            command += [
+                '-map', f"0:a:{track['index']}",
                 '-vn', '-acodec', 'pcm_s16le',
                 '-ar', '44100', '-ac', '2',
-                '-y', str(audio_path)
+                str(audio_path)
             ]
-            subprocess.run(command, check=True, capture_output=True)
+        return command + ['-y']
+
+    def _section_args(self, section):
+        """Input seek options (ffmpeg-python kwargs) for a (start, end) section"""
+        if not section:
+            return {}
+        start, end = section
+        args = {'ss': start}
+        if end is not None:
+            args['t'] = end - start
+        return args
+
+    def _section_flags(self, section):
+        """Input seek options as command line flags for a (start, end) section"""
+        flags = []
+        for key, value in self._section_args(section).items():
+            flags += [f'-{key}', str(value)]
+        return flags
+
+    def _separate_audio(self, audio_paths, video_path=None):
+        """Separate audio using Demucs to isolate vocals (one model load for all files)"""
+        trace_path = self._separation_trace_path(video_path)
+        if self.separator:
+            self.separator.separate(audio_paths, self.work_dir, trace_path)
+            return [self._find_vocals(audio_path) for audio_path in audio_paths]
+
+        command = self.profiler.wrap_python_module(self._separate_command(audio_paths), trace_path)
+
+        try:
+            self.profiler.run(command, text=True)
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Demucs error: {e.stderr}")
 
-        return audio_path
+        return [self._find_vocals(audio_path) for audio_path in audio_paths]
 
-    def _separate_audio(self, audio_path):
-        """Separate audio using Demucs to isolate vocals"""
+    def _separation_trace_path(self, video_path=None):
+        """Trace path for a video's separation; named per video since jobs can share a profiler"""
+        return self.profiler.trace_path(f"separation_{video_path.stem}" if video_path else "separation")
+
+    def _separate_command(self, audio_paths):
+        """Demucs command line separating all given files in one run"""
         # Run Demucs with MP3 output to avoid torchcodec issues
-        command = [
+        return [
             'python', '-m', 'demucs',
-            '-n', Config.DEMUCS_MODEL,
-            '--two-stems', Config.DEMUCS_TWO_STEMS,
+            '-n', self.settings.demucs_model,
+            '--two-stems', self.settings.demucs_two_stems,
             '--mp3',  # <--- ADD THIS LINE to output MP3 instead of WAV
             '--mp3-bitrate', '320',  # <--- ADD THIS LINE for quality
-            '-o', str(Config.TEMP_DIR),
-            str(audio_path)
+            '-o', str(self.work_dir),
+            *[str(audio_path) for audio_path in audio_paths]
         ]
 
-        try:
-            subprocess.run(command, check=True, capture_output=True, text=True)
-        except subprocess.CalledProcessError as e:
-            raise Exception(f"Demucs error: {e.stderr}")
-
+    def _find_vocals(self, audio_path):
+        """Find the Demucs vocals output for an input file"""
         # Find the vocals file - now it will be .mp3
         audio_name = audio_path.stem
-        vocals_path = Config.TEMP_DIR / Config.DEMUCS_MODEL / audio_name / 'vocals.mp3'  # <--- Changed to .mp3
+        model_name = self.settings.demucs_model
+        vocals_path = self.work_dir / model_name / audio_name / 'vocals.mp3'  # <--- Changed to .mp3
 
         if not vocals_path.exists():
             # Try alternative location
-            vocals_path = Config.TEMP_DIR / Config.DEMUCS_MODEL / audio_name / 'no_vocals.mp3'  # <--- Changed to .mp3
+            vocals_path = self.work_dir / model_name / audio_name / 'no_vocals.mp3'  # <--- Changed to .mp3
 
         if not vocals_path.exists():
             raise FileNotFoundError(f"Demucs output not found. Expected at: {vocals_path}")
 
         return vocals_path
 
-    def _combine_video_audio(self, video_path, audio_path):
-        """Combine original video with new audio track"""
-        output_path = Config.OUTPUT_DIR / f"{video_path.stem}_no_music.mp4"
+    def _combine_steps(self, video_path, vocals_groups, tracks, time_ranges=None, source_path=None):
+        """Steps muxing the video with the new audio tracks; returns the output path
 
-        try:
-            # Using ffmpeg-python
-            video_stream = ffmpeg.input(str(video_path)).video
-            audio_stream = ffmpeg.input(str(audio_path)).audio
-
-            (
-                ffmpeg
-                .output(video_stream, audio_stream, str(output_path),
-                       vcodec='copy', acodec='aac', audio_bitrate='192k')
-                .overwrite_output()
-                .run(quiet=True, capture_stderr=True)
-            )
-        except Exception as e:
-            # Fallback to subprocess
-            command = [
-                'ffmpeg', '-i', str(video_path),
-                '-i', str(audio_path),
-                '-c:v', 'copy',
-                '-c:a', 'aac',
-                '-b:a', '192k',
-                '-map', '0:v:0',
-                '-map', '1:a:0',
-                '-y', str(output_path)
+        Each track keeps the stream metadata (language, title, ...) and default flag
+        of the original track it replaces, read from source_path if the audio was
+        downloaded separately.
+
+        With sections, each span of the video is muxed with its tracks and the parts
+        are joined. A span is re-encoded so the cut is frame accurate; its cost scales
+        with the section, not the source. A full-length video is stream-copied unless
+        its codec can't go into the output container.
+        """
+        # Metadata mapping refers to inputs by position, which ffmpeg-python doesn't
+        # guarantee, so this step always uses the explicit command line
+        if not time_ranges:
+            output_path = self._combine_output_path(video_path)
+            copy_video = yield ('call', self._video_copyable, video_path)
+            yield ('run', [self._combine_command(video_path, vocals_groups[0], tracks, output_path,
+                                                 source_path=source_path, copy_video=copy_video)])
+            return output_path
+
+        part_paths = [
+            self._combine_output_path(video_path, section, index) for index, section in enumerate(time_ranges)
+        ]
+        yield ('run', [
+            self._combine_command(video_path, group, tracks, part_path, section, source_path)
+            for section, group, part_path in zip(time_ranges, vocals_groups, part_paths)
+        ])
+        return (yield from self._concat_steps(video_path, part_paths))
+
+    def _video_copyable(self, video_path):
+        """Whether the video stream can be copied into the output container as is"""
+        probe = self._probe(video_path)
+        if probe is None:
+            # Unknown codec: try the copy, as for any local file
+            return True
+        codec = next((stream.get('codec_name') for stream in probe.get('streams', [])
+                      if stream.get('codec_type') == 'video'), None)
+        return is_copyable(codec)
+
+    def _combine_output_path(self, video_path, section=None, index=None):
+        """Output path of a mux: a temp part for sections, the final file otherwise"""
+        if section:
+            return self.work_dir / f"{video_path.stem}_part{index}.{OUTPUT_CONTAINER}"
+        return Config.OUTPUT_DIR / f"{video_path.stem}_no_music.{OUTPUT_CONTAINER}"
+
+    def _combine_command(self, video_path, audio_paths, tracks, output_path, section=None, source_path=None,
+                         copy_video=True):
+        """FFmpeg command line muxing the video (or a section of it) with the new audio tracks
+
+        The video is re-encoded for a section, or when copy_video is False because its
+        codec can't be copied into the output container.
+        """
+        if section or not copy_video:
+            video_flags = ['-c:v', 'libx264', '-preset', self.settings.ffmpeg_preset]
+        else:
+            video_flags = ['-c:v', 'copy']
+
+        command = ['ffmpeg', *self._section_flags(section), '-i', str(video_path)]
+        for audio_path in audio_paths:
+            command += ['-i', str(audio_path)]
+
+        # Stream metadata comes from the file the audio was extracted from; a separate
+        # audio download is an extra input used for nothing else
+        metadata_input = 0
+        if source_path and Path(source_path) != Path(video_path):
+            metadata_input = len(audio_paths) + 1
+            command += ['-i', str(source_path)]
+
+        command += ['-map', '0:v:0']
+        for input_index in range(1, len(audio_paths) + 1):
+            command += ['-map', f'{input_index}:a:0']
+
+        # Any per-stream -map_metadata turns off FFmpeg's automatic stream metadata copy,
+        # so the video stream's tags (language, handler) are mapped explicitly too
+        command += ['-map_metadata:s:v:0', '0:s:v:0']
+        for output_index, track in enumerate(tracks):
+            command += [
+                f'-map_metadata:s:a:{output_index}', f"{metadata_input}:s:a:{track['index']}",
+                f'-disposition:a:{output_index}', 'default' if track['default'] else '0',
             ]
-            subprocess.run(command, check=True, capture_output=True)
 
-        return output_path
+        return command + [
+            *video_flags,
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-shortest',
+            '-y', str(output_path)
+        ]
+
+    def _concat_steps(self, video_path, part_paths):
+        """Steps joining muxed sections into the final output without re-encoding"""
+        output_path = self._combine_output_path(video_path)
+
+        if len(part_paths) == 1:
+            yield ('call', shutil.move, str(part_paths[0]), str(output_path))
+            return output_path
+
+        list_path = self._write_concat_list(video_path, part_paths)
 
-    def _cleanup(self, audio_path, vocals_path):
-        """Clean up temporary files"""
         try:
-            # Remove extracted audio
-            if audio_path.exists():
-                audio_path.unlink()
-
-            # Remove Demucs output directory
-            demucs_output_dir = vocals_path.parent.parent
-            if demucs_output_dir.exists():
-                shutil.rmtree(demucs_output_dir)
-        except Exception as e:
-            print(f"Cleanup warning: {e}")
+            yield ('run', [self._concat_command(list_path, output_path)])
+        finally:
+            list_path.unlink(missing_ok=True)
+            for part_path in part_paths:
+                part_path.unlink(missing_ok=True)
+
+        return output_path
+
+    def _write_concat_list(self, video_path, part_paths):
+        """Write an FFmpeg concat demuxer list for the muxed parts"""
+        list_path = self.work_dir / f"{video_path.stem}_parts.txt"
+        list_path.write_text(
+            ''.join(f"file '{p.resolve().as_posix()}'\n" for p in part_paths),
+            encoding='utf-8'
+        )
+        return list_path
+
+    def _concat_command(self, list_path, output_path):
+        """FFmpeg command line joining parts listed in a concat file"""
+        return [
+            'ffmpeg', '-f', 'concat', '-safe', '0',
+            '-i', str(list_path),
+            '-map', '0',
+            '-c', 'copy',
+            '-y', str(output_path)
+        ]
@@ -0,0 +1,196 @@
+"""
+Per-job profiling: cProfile of the orchestrating code, torch profiler traces of
+inference and subprocess command lines with durations and resource usage.
+
+Everything for one job is written to a bundle directory under Config.PROFILE_DIR:
+    orchestration.pstats     cProfile of the job thread (snakeviz, pstats)
+    orchestration.txt        Top functions by cumulative time
+    demucs_<n>.pstats        cProfile of each Demucs CLI run
+    <name>.trace.json        torch profiler traces of inference, in-process or CLI
+                             (chrome://tracing, Perfetto)
+    subprocesses.json        Command lines, durations, exit codes, resource usage
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from src.config import Config
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def profiling_enabled():
+    """Whether profiling is switched on by Config (or the CLI) or the HVMR_PROFILE env var"""
+    env = os.environ.get('HVMR_PROFILE', '').strip().lower()
+    return Config.PROFILE_JOBS or env in ('1', 'true', 'yes', 'on')
+
+
+class JobProfiler:
+    """
+    Profiler for one job; a no-op unless profiling is enabled
+
+    Use as a context manager around the job to collect the cProfile dump, and route
+    subprocesses through run() so their command lines and resource usage are recorded.
+    """
+
+    def __init__(self, job_name, enabled=None):
+        self.enabled = profiling_enabled() if enabled is None else enabled
+        self.job_name = re.sub(r'[^\w.-]+', '_', str(job_name))[:80] or "job"
+        self.bundle_dir = None
+        self.subprocesses = []
+        self._profile = None
+        self._lock = threading.Lock()
+        self._demucs_runs = 0
+
+        if self.enabled:
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            self.bundle_dir = Config.PROFILE_DIR / f"{self.job_name}_{stamp}_{os.getpid()}"
+            self.bundle_dir.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self):
+        if self.enabled:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profile is not None:
+            self._profile.disable()
+            self._write_pstats(self._profile)
+            self._profile = None
+        self.write_subprocesses()
+
+    def _write_pstats(self, profile):
+        profile.dump_stats(str(self.bundle_dir / 'orchestration.pstats'))
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(40)
+        (self.bundle_dir / 'orchestration.txt').write_text(summary.getvalue(), encoding='utf-8')
+
+    def write_subprocesses(self):
+        """Write the recorded subprocess runs to the bundle"""
+        if not self.enabled:
+            return
+        with self._lock:
+            records = list(self.subprocesses)
+        (self.bundle_dir / 'subprocesses.json').write_text(
+            json.dumps(records, indent=2), encoding='utf-8'
+        )
+
+    def record(self, command, started, duration, returncode, rusage=None):
+        """Record one subprocess run"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.subprocesses.append({
+                'command': [str(arg) for arg in command],
+                'started': started,
+                'duration_s': round(duration, 4),
+                'returncode': returncode,
+                'rusage': rusage,
+            })
+
+    def wrap_python_module(self, command, trace_path=None):
+        """
+        Run a `python -m <module>` command under cProfile when profiling is enabled
+
+        Used for the Demucs CLI, whose inference can't be traced from this process.
+        With a trace_path the module also runs under the torch profiler (through
+        src/trace_module.py), giving the same operator-level trace as in-process
+        separation.
+        """
+        if not self.enabled or len(command) < 3 or command[1] != '-m':
+            return command
+        with self._lock:
+            self._demucs_runs += 1
+            pstats_path = self.bundle_dir / f"{command[2]}_{self._demucs_runs}.pstats"
+        if trace_path:
+            runner = Path(__file__).resolve().with_name('trace_module.py')
+            return [command[0], '-m', 'cProfile', '-o', str(pstats_path),
+                    str(runner), str(trace_path), *command[2:]]
+        return [command[0], '-m', 'cProfile', '-o', str(pstats_path), *command[1:]]
+
+    def trace_path(self, name):
+        """Path for a torch profiler trace in the bundle, or None when disabled"""
+        if not self.enabled:
+            return None
+        return str(self.bundle_dir / f"{name}.trace.json")
+
+    def run(self, command, check=True, capture_output=True, text=False):
+        """
+        subprocess.run replacement that records the command line, duration and
+        resource usage (user/system CPU time and peak RSS, POSIX only)
+        """
+        if not self.enabled:
+            return subprocess.run(command, check=check, capture_output=capture_output, text=text)
+
+        started = time.time()
+        start = time.perf_counter()
+
+        if resource is None or not capture_output:
+            try:
+                result = subprocess.run(command, check=check, capture_output=capture_output, text=text)
+            except subprocess.CalledProcessError as e:
+                self.record(command, started, time.perf_counter() - start, e.returncode)
+                raise
+            self.record(command, started, time.perf_counter() - start, result.returncode)
+            return result
+
+        # Reap the child with wait4 to get its own resource usage; output goes to temp
+        # files because communicate() would reap it first
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            process = subprocess.Popen(command, stdout=out, stderr=err)
+            _, status, usage = os.wait4(process.pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+            process.returncode = returncode
+            duration = time.perf_counter() - start
+
+            out.seek(0)
+            err.seek(0)
+            stdout, stderr = out.read(), err.read()
+
+        if text:
+            stdout = stdout.decode(errors='replace')
+            stderr = stderr.decode(errors='replace')
+
+        # ru_maxrss is kilobytes on Linux, bytes on macOS
+        maxrss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+        self.record(command, started, duration, returncode, {
+            'user_s': round(usage.ru_utime, 4),
+            'system_s': round(usage.ru_stime, 4),
+            'max_rss_kb': maxrss_kb,
+        })
+
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, stdout, stderr)
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+
+@contextmanager
+def torch_trace(trace_path):
+    """Capture a torch profiler trace of the block to trace_path (no-op if None)"""
+    if not trace_path:
+        yield
+        return
+
+    import torch
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    with torch.profiler.profile(activities=activities, record_shapes=True) as profiler:
+        yield
+    Path(trace_path).parent.mkdir(parents=True, exist_ok=True)
+    profiler.export_chrome_trace(str(trace_path))
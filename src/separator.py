@@ -0,0 +1,346 @@
+"""
+In-process Demucs separation with model weights shared across worker processes
+"""
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from pathlib import Path
+from src.config import Config
+from src.profiling import torch_trace
+
+# Force torchaudio to use soundfile backend (avoids torchcodec issue)
+os.environ['TORCHAUDIO_BACKEND'] = 'soundfile'
+
+import soundfile
+import torch
+import torch.multiprocessing as mp
+from demucs.apply import apply_model
+from demucs.audio import convert_audio, save_audio
+from demucs.pretrained import get_model
+
+
+def load_model(model_name):
+    """Load a Demucs model for inference only"""
+    model = get_model(model_name)
+    model.eval()
+    for parameter in model.parameters():
+        parameter.requires_grad_(False)
+    return model
+
+
+def load_audio(model, audio_path):
+    """Load an audio file as a (channels, samples) tensor at the model's sample rate"""
+    data, samplerate = soundfile.read(str(audio_path), dtype='float32', always_2d=True)
+    wav = torch.from_numpy(data.T.copy())
+    return convert_audio(wav, samplerate, model.samplerate, model.audio_channels)
+
+
+def separate_tensor(model, wav, shifts=1):
+    """
+    Separate a (channels, samples) waveform
+
+    Args:
+        model: Demucs model
+        wav: Waveform tensor
+        shifts: Random time shifts averaged by Demucs (0 is fastest, 1 matches the CLI)
+
+    Returns:
+        Dict of stem name -> (channels, samples) tensor
+    """
+    ref = wav.mean(0)
+    mean = ref.mean()
+    std = ref.std() + 1e-8
+    with torch.inference_mode():
+        out = apply_model(model, ((wav - mean) / std)[None], shifts=shifts, split=True, overlap=0.25)
+    out = out * std + mean
+    return dict(zip(model.sources, out[0]))
+
+
+def two_stem_split(sources, two_stems):
+    """Reduce all stems to `two_stems` and `no_<two_stems>`, like `demucs --two-stems`"""
+    stem = sources[two_stems]
+    rest = sum(source for name, source in sources.items() if name != two_stems)
+    return {two_stems: stem, f"no_{two_stems}": rest}
+
+
+def separate_file(model, model_name, two_stems, audio_path, output_dir):
+    """
+    Separate an audio file and write MP3 stems in the same layout as the Demucs CLI
+
+    Returns:
+        Directory holding the stems (output_dir/<model>/<track name>)
+    """
+    wav = load_audio(model, audio_path)
+    stems = two_stem_split(separate_tensor(model, wav), two_stems)
+    return write_stems(model, model_name, stems, audio_path, output_dir)
+
+
+def write_stems(model, model_name, stems, audio_path, output_dir):
+    """Write stems as MP3s to output_dir/<model>/<track name>, returning that directory"""
+    audio_path = Path(audio_path)
+    stem_dir = Path(output_dir) / model_name / audio_path.stem
+    stem_dir.mkdir(parents=True, exist_ok=True)
+    for name, source in stems.items():
+        save_audio(source, str(stem_dir / f"{name}.mp3"), model.samplerate, bitrate=320)
+    return stem_dir
+
+
+def _worker(model, model_name, two_stems, threads, tasks, results, current):
+    """Worker process loop: the model arrives as handles to the parent's shared memory"""
+    if threads:
+        torch.set_num_threads(threads)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        task_id, audio_path, output_dir, trace_path = task
+        # Written straight to shared memory (queue puts are flushed by a thread that
+        # dies with the process), so the parent can fail the task if this worker dies
+        current.value = task_id
+        try:
+            with torch_trace(trace_path):
+                stem_dir = separate_file(model, model_name, two_stems, audio_path, output_dir)
+            results.put((task_id, True, str(stem_dir)))
+        except Exception as e:
+            # Exceptions may not be picklable, send the message instead
+            results.put((task_id, False, f"{type(e).__name__}: {e}"))
+
+
+class SharedModelPool:
+    """
+    Pool of separation worker processes attached to one copy of the model weights
+
+    The parent loads the model once and moves its parameters into shared memory;
+    workers receive handles to those tensors instead of copies, so each worker
+    only adds its own activations (plus the torch/demucs imports) to RAM.
+    """
+
+    def __init__(self, model_name=None, two_stems=None, workers=None, threads_per_worker=None):
+        self.model_name = model_name or Config.DEMUCS_MODEL
+        self.two_stems = two_stems or Config.DEMUCS_TWO_STEMS
+        self.workers = max(1, workers or Config.SEPARATION_WORKERS)
+        # Split the cores between workers instead of letting each one use all of them
+        self.threads_per_worker = (threads_per_worker or Config.SEPARATION_THREADS_PER_WORKER
+                                   or max(1, (os.cpu_count() or 1) // self.workers))
+        self._processes = []      # (process, shared id of the task it is working on)
+        self._futures = {}
+        self._deaths = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._model = None
+        self._ctx = None
+        self._tasks = None
+        self._results = None
+
+    def start(self):
+        """Load the model into shared memory and spawn the workers"""
+        with self._lock:
+            if self._processes:
+                return self
+            if self._deaths > 3 * self.workers:
+                raise RuntimeError("Separation workers keep dying; pool disabled")
+
+            self._model = load_model(self.model_name)
+            self._model.share_memory()
+
+            self._closing = False
+            self._ctx = mp.get_context('spawn')
+            self._tasks = self._ctx.Queue()
+            self._results = self._ctx.Queue()
+            for _ in range(self.workers):
+                self._spawn()
+
+            threading.Thread(target=self._collect_results, daemon=True).start()
+        return self
+
+    def _spawn(self):
+        """Start one worker process (called with the lock held)"""
+        current = self._ctx.Value('q', -1, lock=False)
+        process = self._ctx.Process(
+            target=_worker,
+            args=(self._model, self.model_name, self.two_stems, self.threads_per_worker,
+                  self._tasks, self._results, current),
+            daemon=True
+        )
+        process.start()
+        self._processes.append((process, current))
+
+    def _collect_results(self):
+        """Resolve futures as workers report back, and fail the tasks of workers that die"""
+        while True:
+            try:
+                message = self._results.get(timeout=1)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                break
+            if message:
+                self._resolve(message)
+            self._check_workers()
+
+    def _resolve(self, message):
+        task_id, ok, payload = message
+        with self._lock:
+            future = self._futures.pop(task_id, None)
+        if future is None:
+            return
+        if ok:
+            future.set_result(Path(payload))
+        else:
+            future.set_exception(RuntimeError(f"Demucs error: {payload}"))
+
+    def _check_workers(self):
+        """Fail the tasks of dead workers (e.g. OOM-killed) and replace the workers"""
+        with self._lock:
+            if self._closing or not self._processes:
+                return
+            ready = set(wait([process.sentinel for process, _ in self._processes], timeout=0))
+            dead = [entry for entry in self._processes if entry[0].sentinel in ready]
+        if not dead:
+            return
+
+        # A worker may have finished its task just before dying; take results
+        # that made it into the queue first
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                # close() is running; leave the stop message for the collector loop
+                self._results.put(None)
+                return
+            self._resolve(message)
+
+        failed = []
+        with self._lock:
+            for process, current in dead:
+                self._processes.remove((process, current))
+                self._deaths += 1
+                error = RuntimeError(
+                    f"Separation worker {process.pid} died with exit code {process.exitcode} "
+                    f"(killed for running out of memory?)"
+                )
+                failed.append((self._futures.pop(current.value, None), error))
+                # Keep the pool at full size for the tasks still queued, unless workers
+                # keep dying (e.g. they can't even start)
+                if not self._closing and self._deaths <= 3 * self.workers:
+                    self._spawn()
+
+            if not self._processes:
+                # Nothing left to run the queued tasks
+                error = RuntimeError("All separation workers died; pool disabled")
+                failed += [(future, error) for future in self._futures.values()]
+                self._futures.clear()
+
+        for future, error in failed:
+            if future is not None:
+                future.set_exception(error)
+
+    def submit(self, audio_path, output_dir, trace_path=None):
+        """
+        Queue one file for separation
+
+        Args:
+            audio_path: Audio file to separate
+            output_dir: Directory receiving <model>/<track>/ stems
+            trace_path: Optional path for a torch profiler trace of the inference
+
+        Returns:
+            concurrent.futures.Future resolving to the stem directory
+        """
+        self.start()
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            self._futures[task_id] = future
+        self._tasks.put((task_id, str(audio_path), str(output_dir), trace_path))
+        return future
+
+    def separate(self, audio_paths, output_dir, trace_path=None):
+        """Separate files in parallel across the workers, blocking until all are done"""
+        futures = [
+            self.submit(audio_path, output_dir, self._numbered(trace_path, index))
+            for index, audio_path in enumerate(audio_paths)
+        ]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _numbered(trace_path, index):
+        """Give each file of a batch its own trace file"""
+        if not trace_path or index == 0:
+            return trace_path
+        return trace_path.replace('.trace.json', f'_{index}.trace.json')
+
+    def for_settings(self, settings):
+        """This pool if it serves the job's model and stems, otherwise None"""
+        if (settings.demucs_model, settings.demucs_two_stems) == (self.model_name, self.two_stems):
+            return self
+        return None
+
+    def close(self):
+        """Stop the workers"""
+        with self._lock:
+            processes = [process for process, _ in self._processes]
+            self._processes = []
+            self._closing = True
+        if not processes:
+            return
+        for _ in processes:
+            self._tasks.put(None)
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ModelPools:
+    """
+    SharedModelPools keyed by (model, stems), so jobs with different settings can
+    run side by side
+
+    Pools are created on first use. Each pool holds its own copy of its model's
+    weights and its own workers, so a host serving many models needs RAM for each.
+    """
+
+    def __init__(self, workers=None, threads_per_worker=None):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def for_settings(self, settings):
+        """The pool for a job's model and stems"""
+        key = (settings.demucs_model, settings.demucs_two_stems)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = SharedModelPool(*key, self.workers, self.threads_per_worker)
+                self._pools[key] = pool
+        return pool
+
+    def close(self):
+        """Stop every pool's workers"""
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
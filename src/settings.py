@@ -0,0 +1,137 @@
+"""
+Per-job settings: an immutable snapshot of the tunables a job runs with
+
+Settings are layered, later layers winning:
+    1. Config class attributes (the defaults)
+    2. A JSON file (Config.SETTINGS_FILE, or a path given to Settings.load)
+    3. HVMR_<NAME> environment variables, e.g. HVMR_DEMUCS_MODEL=mdx_extra_q
+    4. Per-job overrides
+
+None is a real value for settings where it means something (audio_tracks: all
+tracks, max_video_height: no limit); elsewhere it leaves the setting unchanged.
+
+Process-wide resources (directories, the temp manager's disk policy, worker
+counts, GUI) stay on Config; everything that may differ between two jobs
+running side by side lives here.
+"""
+import dataclasses
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from src.config import Config
+
+ENV_PREFIX = "HVMR_"
+
+# Default of every field: "not set here, use the next layer down"
+_UNSET = object()
+
+# Settings for which None is a value rather than "unset"
+_NULLABLE = frozenset({'audio_tracks', 'max_video_height'})
+
+
+@dataclass(frozen=True)
+class Settings:
+    ytdlp_format: str = _UNSET
+    ytdlp_merge_format: str = _UNSET
+    separate_streams: bool = _UNSET
+    max_video_height: int = _UNSET
+    concurrent_fragments: int = _UNSET
+    demucs_model: str = _UNSET
+    demucs_two_stems: str = _UNSET
+    audio_tracks: tuple = _UNSET
+    ffmpeg_preset: str = _UNSET
+    temp_space_headroom: float = _UNSET
+
+    def __post_init__(self):
+        # Unset fields take the Config default; lists are frozen into tuples
+        for field in dataclasses.fields(self):
+            value = getattr(self, field.name)
+            if value is _UNSET or (value is None and field.name not in _NULLABLE):
+                value = getattr(Config, field.name.upper())
+            if field.name == 'audio_tracks' and isinstance(value, str) and value.lower() == 'all':
+                value = None
+            if isinstance(value, list):
+                value = tuple(value)
+            object.__setattr__(self, field.name, value)
+
+    @classmethod
+    def load(cls, path=None, environ=None, **overrides):
+        """
+        Build settings from Config, a JSON file, the environment and overrides
+
+        Args:
+            path: JSON settings file (defaults to Config.SETTINGS_FILE if it exists)
+            environ: Environment mapping (defaults to os.environ)
+            **overrides: Per-job values; None leaves a setting unchanged unless None is
+                meaningful for it (audio_tracks=None selects all tracks)
+
+        Returns:
+            Frozen Settings instance
+        """
+        values = {}
+        values.update(cls._from_file(path))
+        values.update(cls._from_env(os.environ if environ is None else environ))
+        values.update(cls._explicit(overrides))
+        cls._check_names(values, "override")
+        return cls(**values)
+
+    def replace(self, **overrides):
+        """Copy with some settings changed (None as in load())"""
+        overrides = self._explicit(overrides)
+        self._check_names(overrides, "override")
+        return dataclasses.replace(self, **overrides)
+
+    @staticmethod
+    def _explicit(values):
+        """Drop None values for settings where None only means leave unchanged"""
+        return {name: value for name, value in values.items() if value is not None or name in _NULLABLE}
+
+    @classmethod
+    def _check_names(cls, values, source):
+        known = {field.name for field in dataclasses.fields(cls)}
+        unknown = sorted(set(values) - known)
+        if unknown:
+            raise ValueError(f"Unknown setting(s) in {source}: {', '.join(unknown)}")
+
+    @classmethod
+    def _from_file(cls, path=None):
+        """Settings from a JSON object file; a missing default file is not an error"""
+        if path is None:
+            path = Config.SETTINGS_FILE
+            if not path or not Path(path).exists():
+                return {}
+
+        with open(path, encoding='utf-8') as f:
+            values = json.load(f)
+        if not isinstance(values, dict):
+            raise ValueError(f"Settings file {path} must contain a JSON object")
+        cls._check_names(values, str(path))
+        return cls._explicit(values)
+
+    @classmethod
+    def _from_env(cls, environ):
+        """Settings from HVMR_<NAME> environment variables"""
+        values = {}
+        for field in dataclasses.fields(cls):
+            raw = environ.get(ENV_PREFIX + field.name.upper())
+            if raw is None or raw.strip() == "":
+                continue
+            values[field.name] = cls._parse_env(field, raw.strip())
+        return values
+
+    @staticmethod
+    def _parse_env(field, raw):
+        if field.name in _NULLABLE and raw.lower() in ('all', 'none'):
+            return None
+        if field.type in ('bool', bool):
+            return raw.lower() in ('1', 'true', 'yes', 'on')
+        if field.type in ('int', int):
+            return int(raw)
+        if field.type in ('float', float):
+            return float(raw)
+        if field.type in ('tuple', tuple):
+            # Comma separated; numbers become stream indices, anything else a language
+            return tuple(int(item) if item.isdigit() else item
+                         for item in (part.strip() for part in raw.split(',')) if item)
+        return raw
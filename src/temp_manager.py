@@ -0,0 +1,252 @@
+"""
+Temp storage manager: per-job scratch directories, RAM-disk placement,
+disk-space admission control and an orphan janitor
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, asynccontextmanager
+from pathlib import Path
+from src.config import Config
+
+# 44.1 kHz, stereo, 16-bit PCM
+WAV_BYTES_PER_SECOND = 44100 * 2 * 2
+# Two 320 kbps MP3 stems written by Demucs
+STEMS_BYTES_PER_SECOND = 2 * 320000 // 8
+
+JOB_DIR_PREFIX = "job_"
+MARKER_FILE = ".job.json"
+
+
+class TempManager:
+    # Shared by every instance in the process so concurrent jobs see each other's reservations
+    _lock = threading.Lock()
+    _reserved = {}
+    _active = set()
+
+    def __init__(self, status_callback=None):
+        self.status_callback = status_callback
+        self._janitor_stop = None
+
+    def estimate_scratch_bytes(self, duration_seconds, extra_bytes=0, headroom=None):
+        """
+        Estimate the scratch space a job needs
+
+        Args:
+            duration_seconds: Seconds of audio that will be extracted and separated
+            extra_bytes: Other intermediates (e.g. muxed section parts)
+            headroom: Safety factor (defaults to Config.TEMP_SPACE_HEADROOM)
+
+        Returns:
+            Estimated bytes, including the headroom
+        """
+        per_second = WAV_BYTES_PER_SECOND + STEMS_BYTES_PER_SECOND
+        headroom = headroom or Config.TEMP_SPACE_HEADROOM
+        return int((duration_seconds * per_second + extra_bytes) * headroom)
+
+    def _ram_disk_root(self):
+        """Scratch root on the RAM disk, or None if unavailable"""
+        ram_dir = Config.RAM_DISK_DIR
+        if not Config.USE_RAM_DISK or not ram_dir or not Path(ram_dir).is_dir():
+            return None
+        return Path(ram_dir) / "halalvideomusicremover"
+
+    def _candidate_roots(self, required_bytes):
+        """Scratch roots to try in order of preference"""
+        roots = []
+        ram_root = self._ram_disk_root()
+        if ram_root is not None:
+            ram_usage = shutil.disk_usage(ram_root.parent)
+            # Only use tmpfs when the job fits without eating most of the RAM
+            if required_bytes <= ram_usage.total * Config.RAM_DISK_MAX_FRACTION:
+                roots.append((ram_root, ram_usage.total * (1 - Config.RAM_DISK_MAX_FRACTION)))
+        roots.append((Config.TEMP_DIR, 0))
+        return roots
+
+    def _try_reserve(self, required_bytes):
+        """Reserve space on the first root that has room, returning the root or None"""
+        with self._lock:
+            for root, keep_free in self._candidate_roots(required_bytes):
+                root.mkdir(parents=True, exist_ok=True)
+                free = shutil.disk_usage(root).free - self._reserved.get(root, 0) - keep_free
+                if free >= required_bytes:
+                    self._reserved[root] = self._reserved.get(root, 0) + required_bytes
+                    return root
+        return None
+
+    def _release(self, root, required_bytes):
+        with self._lock:
+            self._reserved[root] = max(0, self._reserved.get(root, 0) - required_bytes)
+
+    def _check_fits(self, required_bytes):
+        """Fail fast when no amount of waiting would free enough space"""
+        Config.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        total = shutil.disk_usage(Config.TEMP_DIR).total
+        if required_bytes > total:
+            raise RuntimeError(
+                f"Job needs about {required_bytes / 1024**3:.1f} GB of temp space, "
+                f"but {Config.TEMP_DIR} only has {total / 1024**3:.1f} GB in total."
+            )
+
+    def _create_job_dir(self, root):
+        """Create a job directory with a marker the janitor uses to detect orphans"""
+        job_dir = root / f"{JOB_DIR_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        job_dir.mkdir(parents=True)
+        (job_dir / MARKER_FILE).write_text(
+            json.dumps({'pid': os.getpid(), 'created': time.time()}), encoding='utf-8'
+        )
+        with self._lock:
+            self._active.add(job_dir)
+        return job_dir
+
+    def _remove_job_dir(self, job_dir):
+        with self._lock:
+            self._active.discard(job_dir)
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _report_waiting(self, required_bytes):
+        if self.status_callback:
+            self.status_callback(
+                f"Waiting for {required_bytes / 1024**3:.1f} GB of free temp space..."
+            )
+
+    @contextmanager
+    def job_dir(self, required_bytes):
+        """
+        Scratch directory for one job, removed when the block exits (even on errors)
+
+        Delays the job until enough free space is available, up to
+        Config.TEMP_ADMISSION_TIMEOUT seconds.
+        """
+        self._check_fits(required_bytes)
+        deadline = time.monotonic() + Config.TEMP_ADMISSION_TIMEOUT
+        root = self._try_reserve(required_bytes)
+        while root is None:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Timed out waiting for free temp space.")
+            self._report_waiting(required_bytes)
+            time.sleep(Config.TEMP_ADMISSION_POLL)
+            root = self._try_reserve(required_bytes)
+
+        job_dir = None
+        try:
+            job_dir = self._create_job_dir(root)
+            yield job_dir
+        finally:
+            if job_dir is not None:
+                self._remove_job_dir(job_dir)
+            self._release(root, required_bytes)
+
+    @asynccontextmanager
+    async def async_job_dir(self, required_bytes):
+        """Awaitable version of job_dir that waits for space without blocking the loop"""
+        self._check_fits(required_bytes)
+        deadline = time.monotonic() + Config.TEMP_ADMISSION_TIMEOUT
+        root = self._try_reserve(required_bytes)
+        while root is None:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Timed out waiting for free temp space.")
+            self._report_waiting(required_bytes)
+            await asyncio.sleep(Config.TEMP_ADMISSION_POLL)
+            root = self._try_reserve(required_bytes)
+
+        job_dir = None
+        try:
+            job_dir = self._create_job_dir(root)
+            yield job_dir
+        finally:
+            if job_dir is not None:
+                self._remove_job_dir(job_dir)
+            self._release(root, required_bytes)
+
+    def _pid_alive(self, pid):
+        """Whether a process exists (POSIX only; None when it can't be checked)"""
+        if sys.platform == 'win32':
+            # os.kill would terminate the process on Windows; rely on age instead
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _is_orphan(self, path, now):
+        """Whether a temp artifact belongs to no running job"""
+        if path in self._active:
+            return False
+
+        age = now - path.stat().st_mtime
+        marker = path / MARKER_FILE
+        if path.name.startswith(JOB_DIR_PREFIX) and marker.exists():
+            try:
+                info = json.loads(marker.read_text(encoding='utf-8'))
+                age = now - info['created']
+                alive = self._pid_alive(info['pid'])
+                if alive is not None and info['pid'] != os.getpid():
+                    return not alive
+            except (ValueError, KeyError, OSError):
+                pass
+
+        # Legacy artifacts (loose WAVs, Demucs trees) and unverifiable job dirs
+        return age > Config.ORPHAN_MAX_AGE
+
+    def collect_orphans(self):
+        """
+        Delete temp artifacts left behind by crashed or killed jobs
+
+        Returns:
+            Number of removed files/directories
+        """
+        removed = 0
+        now = time.time()
+        roots = [Config.TEMP_DIR]
+        ram_root = self._ram_disk_root()
+        if ram_root is not None:
+            roots.append(ram_root)
+
+        for root in roots:
+            if not root.exists():
+                continue
+            for path in root.iterdir():
+                try:
+                    if not self._is_orphan(path, now):
+                        continue
+                    if path.is_dir():
+                        shutil.rmtree(path)
+                    else:
+                        path.unlink()
+                    removed += 1
+                except OSError as e:
+                    print(f"Cleanup warning: {e}")
+
+        return removed
+
+    def start_janitor(self, interval=None):
+        """
+        Collect orphans now and then periodically in a background thread
+
+        Returns:
+            threading.Event that stops the janitor when set
+        """
+        if self._janitor_stop is not None:
+            return self._janitor_stop
+
+        stop = threading.Event()
+        interval = interval or Config.JANITOR_INTERVAL
+
+        def janitor():
+            while True:
+                self.collect_orphans()
+                if stop.wait(interval):
+                    break
+
+        threading.Thread(target=janitor, daemon=True).start()
+        self._janitor_stop = stop
+        return stop
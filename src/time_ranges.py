@@ -0,0 +1,91 @@
+"""
+Time range helpers for partial processing
+"""
+
+
+def parse_timestamp(text):
+    """
+    Parse a timestamp like "75", "1:15" or "01:01:15.5" into seconds
+
+    Args:
+        text: Timestamp string
+
+    Returns:
+        Seconds as float
+    """
+    text = text.strip()
+    if not text:
+        raise ValueError("Empty timestamp")
+
+    seconds = 0.0
+    for part in text.split(':'):
+        try:
+            value = float(part)
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {text}")
+        if value < 0:
+            raise ValueError(f"Invalid timestamp: {text}")
+        seconds = seconds * 60 + value
+    return seconds
+
+
+def parse_time_ranges(text):
+    """
+    Parse comma separated ranges like "10:00-25:00, 1:00:00-" into sorted (start, end) tuples
+
+    An empty end means "until the end of the video" and is returned as None.
+    Overlapping or touching ranges are merged.
+
+    Args:
+        text: Range string
+
+    Returns:
+        List of (start, end) tuples in seconds, or None if text is empty
+    """
+    if not text or not text.strip():
+        return None
+
+    ranges = []
+    for chunk in text.split(','):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        if '-' not in chunk:
+            raise ValueError(f"Invalid time range (expected start-end): {chunk}")
+
+        start_text, end_text = chunk.split('-', 1)
+        start = parse_timestamp(start_text) if start_text.strip() else 0.0
+        end = parse_timestamp(end_text) if end_text.strip() else None
+
+        if end is not None and end <= start:
+            raise ValueError(f"Time range ends before it starts: {chunk}")
+        ranges.append((start, end))
+
+    return merge_time_ranges(ranges) or None
+
+
+def merge_time_ranges(ranges):
+    """Sort ranges and merge the ones that overlap"""
+    merged = []
+    for start, end in sorted(ranges, key=lambda r: r[0]):
+        if merged:
+            last_start, last_end = merged[-1]
+            if last_end is None or start <= last_end:
+                if last_end is not None and (end is None or end > last_end):
+                    merged[-1] = (last_start, end)
+                continue
+        merged.append((start, end))
+    return merged
+
+
+def format_timestamp(seconds):
+    """Format seconds as H:MM:SS (or M:SS) for logs and filenames"""
+    if seconds is None:
+        return "end"
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
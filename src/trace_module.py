@@ -0,0 +1,36 @@
+"""
+Run a Python module under the torch profiler and write a chrome trace
+
+Used to profile the Demucs CLI when profiling is enabled:
+    python src/trace_module.py <trace.json> <module> [args...]
+
+Run by path (not -m) so it works from any working directory.
+"""
+import runpy
+import sys
+from pathlib import Path
+
+# Make `src` importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.profiling import torch_trace
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.exit("usage: trace_module.py <trace.json> <module> [args...]")
+
+    trace_path, module = sys.argv[1], sys.argv[2]
+    # The module sees its own arguments, as with `python -m <module>`
+    sys.argv = [module, *sys.argv[3:]]
+
+    with torch_trace(trace_path):
+        try:
+            runpy.run_module(module, run_name='__main__', alter_sys=True)
+        except SystemExit as e:
+            if e.code:
+                raise
+
+
+if __name__ == "__main__":
+    main()